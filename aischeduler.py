@@ -0,0 +1,122 @@
+'''
+@author: Ned Austin Datiles
+'''
+from heapq import heappush, heappop
+from time import perf_counter
+from settings import AI_LOD_TIERS, AI_SLEEP_INTERVAL, AI_FRAME_BUDGET, AI_MAX_DT
+
+
+class AIScheduler:
+    """
+    Level of detail scheduler for the mobs' AI.
+    Mobs close to their prey are updated every frame, mobs further away every few
+    frames with the time since their last update as their dt, and mobs that are not
+    active or are beyond the last tier are put to sleep and only checked now and then.
+    Due mobs are updated most overdue first, closest tier first, until the frame's
+    time budget runs out; the rest wait for the next frame, so the time spent on AI
+    stays flat however many mobs there are.
+    """
+
+    def __init__(self, tiers=AI_LOD_TIERS, sleep_interval=AI_SLEEP_INTERVAL, budget=AI_FRAME_BUDGET,
+                 max_dt=AI_MAX_DT):
+        """
+        Creates a scheduler with no mobs.
+        :param tiers: List of (distance, interval) pairs, closest first. Mobs within
+                the distance of their prey are updated once every interval frames.
+        :param sleep_interval: Frames between updates of sleeping mobs.
+        :param budget: Microseconds of AI allowed per frame.
+        :param max_dt: The longest step in seconds a mob is advanced by at once.
+        """
+        self.tiers = tiers
+        self.sleep_interval = sleep_interval
+        self.budget = budget
+        self.max_dt = max_dt
+        self.frame = 0
+        # Seconds of game time so far
+        self.clock = 0
+        # Heap of (due frame, interval, order added, mob), and the frame each mob is due.
+        # Entries left behind when a mob is rescheduled early are skipped
+        self.queue = []
+        self.order = 0
+        self.due = {}
+        # mob -> clock at its last update
+        self.last_update = {}
+        # Mobs updated during the most recent frame
+        self.updated = 0
+
+    def add(self, mob):
+        """
+        Schedules a mob to be updated on the next frame.
+        :param mob: The mob to schedule.
+        :return: None
+        """
+        self.last_update[mob] = self.clock
+        self.schedule(mob, 1)
+
+    def schedule(self, mob, interval):
+        """
+        Queues a mob's next update.
+        :param mob: The mob to schedule.
+        :param interval: Frames until the update is due.
+        :return: None
+        """
+        self.order += 1
+        self.due[mob] = self.frame + interval
+        heappush(self.queue, (self.frame + interval, interval, self.order, mob))
+
+    def wake(self, mob):
+        """
+        Brings a mob's next update forward to the next frame, e.g. when it becomes active.
+        :param mob: The mob to wake.
+        :return: None
+        """
+        if self.due.get(mob, 0) > self.frame + 1:
+            self.schedule(mob, 1)
+
+    def interval(self, mob, prey):
+        """
+        Picks how often a mob is updated.
+        :param mob: The mob under consideration.
+        :param prey: The entity the mob is chasing.
+        :return: Frames between the mob's updates.
+        """
+        if not mob.is_onscreen:
+            return self.sleep_interval
+        dist = mob.pos.distance_squared_to(prey.pos)
+        for radius, interval in self.tiers:
+            if dist <= radius ** 2:
+                return interval
+        return self.sleep_interval
+
+    def update(self, prey, dt):
+        """
+        Updates the mobs that are due for up to one frame's budget.
+        :param prey: The entity the mobs are chasing.
+        :param dt: Seconds since the last frame.
+        :return: None
+        """
+        self.frame += 1
+        self.clock += dt
+        self.updated = 0
+        deadline = perf_counter() + self.budget / 1000000
+        queue = self.queue
+        while queue and queue[0][0] <= self.frame:
+            # At least one mob is updated every frame, so nobody waits forever
+            if self.updated and perf_counter() >= deadline:
+                break
+            due, _, _, mob = heappop(queue)
+            if self.due.get(mob) != due:
+                continue
+            if not mob.alive():
+                del self.last_update[mob]
+                del self.due[mob]
+                continue
+            elapsed = min(self.clock - self.last_update[mob], self.max_dt)
+            self.last_update[mob] = self.clock
+            mob.update(elapsed)
+            self.updated += 1
+            if mob.alive():
+                self.schedule(mob, self.interval(mob, prey))
+            else:
+                del self.last_update[mob]
+                del self.due[mob]
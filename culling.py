@@ -0,0 +1,83 @@
+'''
+@author: Ned Austin Datiles
+'''
+from settings import TILESIZE, CULL_MARGIN, CULL_CELL_SIZE, ACTIVE_MARGIN
+from spatialhash import SpatialHash
+
+
+class Culler:
+    """
+    Works out once per frame which sprites the camera can see, and which mobs are
+    close enough to it to be active.
+    Walls never move, so they are bucketed once in a spatial hash of their own. Mobs
+    are looked up in the game's mob grid, or taken from the horde, which keeps track
+    of the mobs near the screen itself. The few other moving sprites are checked
+    directly. The visible set is what gets drawn. Mobs are active within a much wider
+    band, so that they can close in on the player from beyond the screen.
+    """
+
+    def __init__(self, game, margin=CULL_MARGIN, cell_size=CULL_CELL_SIZE, active_margin=ACTIVE_MARGIN):
+        """
+        Creates a culler for a game whose walls are already in place.
+        :param game: The game whose sprites are culled.
+        :param margin: How far beyond the edges of the screen sprites count as visible.
+        :param cell_size: Width and height of the cells walls are bucketed into.
+        :param active_margin: How far beyond the edges of the screen mobs are active.
+        """
+        self.game = game
+        self.margin = margin
+        self.active_margin = active_margin
+        # Sprites are bucketed by their centers, so look far enough out to catch a wall's edge
+        self.walls = SpatialHash(cell_size, TILESIZE)
+        self.walls.rebuild(game.walls)
+        self.visible = set()
+        self.active = set()
+        # The visible sprites in the order they are drawn
+        self.sprites = []
+
+    def update(self):
+        """
+        Recomputes the visible sprites and active mobs, and wakes up the mobs that became active.
+        :return: None
+        """
+        game = self.game
+        view = game.camera.view(self.margin)
+        # Mob images are wider than a tile, and mobs move after the grid is rebuilt
+        search = view.inflate(2 * TILESIZE, 2 * TILESIZE)
+        if game.horde:
+            # The horde steers every mob itself and only needs the ones it synced drawn
+            mobs = game.horde.synced
+            active = set()
+        else:
+            active_view = game.camera.view(self.active_margin)
+            mobs = [mob for mob in game.mob_grid.query_rect(active_view.inflate(2 * TILESIZE, 2 * TILESIZE))
+                    if mob.rect.colliderect(active_view)]
+            active = set(mobs)
+        visible = set()
+        for group in (self.walls.query_rect(search), mobs, game.bullets, game.items, game.effects,
+                      (game.player,)):
+            for sprite in group:
+                if sprite.rect.colliderect(view):
+                    visible.add(sprite)
+        if game.ai_scheduler:
+            for mob in mobs:
+                if mob not in self.active:
+                    game.ai_scheduler.wake(mob)
+        self.visible = visible
+        self.active = active
+        # The sprite group keeps its sprites in drawing order, which a set would lose
+        self.sprites = [sprite for sprite in game.all_sprites.sprites() if sprite in visible]
+
+    def is_visible(self, sprite):
+        """
+        :param sprite: The sprite under consideration.
+        :return: True if the sprite was visible at the last update, False otherwise.
+        """
+        return sprite in self.visible
+
+    def is_active(self, mob):
+        """
+        :param mob: The mob under consideration.
+        :return: True if the mob was close enough to the screen to be active at the last update, False otherwise.
+        """
+        return mob in self.active
@@ -0,0 +1,232 @@
+'''
+@author: Ned Austin Datiles
+'''
+import heap
+from pathfinding import Pathfinder
+from settings import TILESIZE
+
+INFINITY = float('inf')
+
+
+class DStarLite:
+    """
+    Incremental planner for a pursuer chasing a moving target (D* Lite).
+    The search is rooted at the pursuer's "anchor" tile and grows towards the
+    target, so g(n) is the cost of walking from the anchor to n. When the target
+    steps into a new tile only the key modifier km changes, and when walls change
+    only the affected cells are repaired, so most replans touch a handful of nodes
+    instead of starting over. The search is re-rooted only when the pursuer wanders
+    off the path it was given.
+    """
+
+    def __init__(self, graph):
+        """
+        Creates a planner with no search state.
+        :param graph: The weighted graph to plan over.
+        """
+        self.graph = graph
+        self.anchor = -1
+        self.start = -1
+        self.km = 0
+        self.g = {}
+        self.rhs = {}
+        self.open = heap.IndexedMinHeap()
+        # Snapshot of the graph used to work out which cells changed
+        self.graph_version = -1
+        self.grid = None
+        self.weights = None
+        self.last_query = None
+        self.path = None
+        # Number of nodes expanded by the most recent call to plan
+        self.expanded = 0
+
+    def heuristic(self, a, b):
+        """
+        Octile distance between two nodes, which never overestimates
+        the cost of 10 per orthogonal and 14 per diagonal step.
+        :param a: A node id.
+        :param b: Another node id.
+        :return: Integer lower bound on the cost from a to b.
+        """
+        width = self.graph.width
+        dx = abs(a % width - b % width)
+        dy = abs(a // width - b // width)
+        return 10 * max(dx, dy) + 4 * min(dx, dy)
+
+    def key(self, node):
+        """
+        Priority of a node in the open list.
+        :param node: The node id.
+        :return: A (primary, secondary) tuple.
+        """
+        best = min(self.g.get(node, INFINITY), self.rhs.get(node, INFINITY))
+        return best + self.heuristic(self.start, node) + self.km, best
+
+    def reset(self, anchor, start):
+        """
+        Throws away the search state and roots a new search at anchor.
+        :param anchor: The pursuer's node id.
+        :param start: The target's node id.
+        :return: None
+        """
+        self.anchor = anchor
+        self.start = start
+        self.km = 0
+        self.g = {}
+        self.rhs = {anchor: 0}
+        self.open.clear()
+        self.open.push(anchor, (self.heuristic(start, anchor), 0))
+
+    def update_vertex(self, node):
+        """
+        Recomputes a node's one step lookahead cost and
+        (re)queues the node if it has become inconsistent.
+        :param node: The node id.
+        :return: None
+        """
+        g = self.g
+        if node != self.anchor:
+            offsets, targets, _ = self.graph.adjacency()
+            reverse_costs = self.graph.reverse_costs()
+            best = INFINITY
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                cost = g.get(neighbour, INFINITY)
+                if cost != INFINITY:
+                    cost += reverse_costs[edge]
+                    if cost < best:
+                        best = cost
+            if best == INFINITY:
+                self.rhs.pop(node, None)
+            else:
+                self.rhs[node] = best
+        self.open.remove(node)
+        if g.get(node, INFINITY) != self.rhs.get(node, INFINITY):
+            self.open.push(node, self.key(node))
+
+    def compute_shortest_path(self):
+        """
+        Expands inconsistent nodes until the target's cost is known.
+        :return: None
+        """
+        offsets, targets, _ = self.graph.adjacency()
+        g = self.g
+        rhs = self.rhs
+        start = self.start
+        while self.open and (self.open.peek()[0] < self.key(start) or
+                             rhs.get(start, INFINITY) != g.get(start, INFINITY)):
+            old_key, node = self.open.peek()
+            new_key = self.key(node)
+            self.expanded += 1
+            if old_key < new_key:
+                self.open.update(node, new_key)
+            elif g.get(node, INFINITY) > rhs.get(node, INFINITY):
+                g[node] = rhs[node]
+                self.open.pop()
+                for edge in range(offsets[node], offsets[node + 1]):
+                    self.update_vertex(targets[edge])
+            else:
+                g.pop(node, None)
+                self.update_vertex(node)
+                for edge in range(offsets[node], offsets[node + 1]):
+                    self.update_vertex(targets[edge])
+
+    def sync_graph(self):
+        """
+        Repairs the search around every cell whose wall or weight
+        has changed since the planner last looked at the graph.
+        :return: None
+        """
+        graph = self.graph
+        if self.grid is None or len(self.grid) != len(graph.grid):
+            self.anchor = -1
+        elif self.anchor != -1:
+            changed = {node for node, (old, new) in enumerate(zip(self.grid, graph.grid)) if old != new}
+            changed.update(graph.node_id(item[0]) for item in set(self.weights.items()) ^ set(graph.weights.items()))
+            for node in changed:
+                x, y = graph.node_coords(node)
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        if graph.in_bounds((x + dx, y + dy)):
+                            self.update_vertex(graph.node_id((x + dx, y + dy)))
+        self.grid = bytes(graph.grid)
+        self.weights = dict(graph.weights)
+        self.graph_version = graph.version
+
+    def extract_path(self):
+        """
+        Follows the cheapest neighbours from the target back to the anchor.
+        :return: A list of node ids from anchor to target, or None.
+        """
+        if self.g.get(self.start, INFINITY) == INFINITY:
+            return None
+        offsets, targets, _ = self.graph.adjacency()
+        reverse_costs = self.graph.reverse_costs()
+        g = self.g
+        current = self.start
+        path = [current]
+        while current != self.anchor:
+            best = -1
+            best_cost = INFINITY
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[edge]
+                cost = g.get(neighbour, INFINITY)
+                if cost != INFINITY:
+                    cost += reverse_costs[edge]
+                    if cost < best_cost:
+                        best = neighbour
+                        best_cost = cost
+            if best == -1 or len(path) > len(g):
+                return None
+            current = best
+            path.append(current)
+        path.reverse()
+        return path
+
+    def plan(self, pos, target):
+        """
+        Plans (or repairs) a path from a pursuer to its target.
+        :param pos: World space position of the pursuer.
+        :param target: World space position of the target.
+        :return: A list of Vector2 objects from the target back to the
+                pursuer in the same order as Pathfinder.a_star_search,
+                or None if there is no path.
+        """
+        graph = self.graph
+        node = (pos.x // TILESIZE, pos.y // TILESIZE)
+        goal = (target.x // TILESIZE, target.y // TILESIZE)
+        if not graph.in_bounds(node) or not graph.in_bounds(goal):
+            return None
+        node = graph.node_id(node)
+        goal = graph.node_id(goal)
+        query = (node, goal, graph.version)
+        if query == self.last_query:
+            return self.path
+        self.last_query = query
+        self.expanded = 0
+        if graph.grid[node] or graph.grid[goal]:
+            self.path = None
+            return None
+
+        if self.graph_version != graph.version:
+            self.sync_graph()
+        if self.anchor == -1:
+            self.reset(node, goal)
+        elif goal != self.start:
+            self.km += self.heuristic(self.start, goal)
+            self.start = goal
+        self.compute_shortest_path()
+        path = self.extract_path()
+        if path is None or node not in path:
+            # The pursuer has left the search tree, root a fresh search at it
+            self.reset(node, goal)
+            self.compute_shortest_path()
+            path = self.extract_path()
+        if path is None:
+            self.path = None
+            return None
+        # Any suffix of a shortest path is itself a shortest path
+        path = path[path.index(node):]
+        path.reverse()
+        self.path = Pathfinder.to_waypoints(graph, path)
+        return self.path
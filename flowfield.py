@@ -0,0 +1,113 @@
+'''
+@author: Ned Austin Datiles
+'''
+import heap
+from settings import TILESIZE, vec
+
+
+class FlowField:
+    """
+    Shared navigation field towards a single goal tile.
+    One Dijkstra search is run outward from the goal over the whole graph and every
+    reachable tile remembers which neighbour takes it one step closer to the goal.
+    Any number of entities can then steer towards the goal by looking up their tile.
+    """
+
+    def __init__(self, graph):
+        """
+        Creates an empty flow field.
+        :param graph: The weighted graph the field covers.
+        """
+        self.graph = graph
+        self.goal = -1
+        self.graph_version = -1
+        # Cost of reaching the goal from each node, -1 if unreachable
+        self.distance = []
+        # The neighbouring node id to step into from each node, -1 if none
+        self.next_node = []
+
+    def update(self, target):
+        """
+        Recomputes the field if the target has moved into a different tile
+        or the graph's walls have changed since the last computation.
+        :param target: World space position of the goal.
+        :return: True if the field was recomputed, False otherwise.
+        """
+        tile = (target.x // TILESIZE, target.y // TILESIZE)
+        if not self.graph.in_bounds(tile):
+            return False
+        goal = self.graph.node_id(tile)
+        if goal == self.goal and self.graph.version == self.graph_version:
+            return False
+        self.compute(goal)
+        return True
+
+    def compute(self, goal):
+        """
+        Runs Dijkstra's algorithm outwards from the goal.
+        Edges are relaxed in reverse, so the cost recorded for a node is the
+        cost of walking from that node to the goal.
+        :param goal: The goal node id.
+        :return: None
+        """
+        graph = self.graph
+        offsets, targets, _ = graph.adjacency()
+        reverse_costs = graph.reverse_costs()
+        size = len(offsets) - 1
+        distance = [-1] * size
+        next_node = [-1] * size
+        frontier = heap.IndexedMinHeap()
+
+        distance[goal] = 0
+        frontier.push(goal, 0)
+        while frontier:
+            current_cost, current = frontier.pop()
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[edge]
+                next_cost = current_cost + reverse_costs[edge]
+                if distance[neighbour] == -1 or next_cost < distance[neighbour]:
+                    distance[neighbour] = next_cost
+                    next_node[neighbour] = current
+                    frontier.push(neighbour, next_cost)
+
+        self.goal = goal
+        self.graph_version = graph.version
+        self.distance = distance
+        self.next_node = next_node
+
+    def step_from(self, node):
+        """
+        Finds the node to move into from the given node.
+        Impassable nodes are not part of the field, so an entity that has been
+        pushed into a wall is pointed at its cheapest passable neighbour instead.
+        :param node: The node id under consideration.
+        :return: The next node id, or -1 if there is nowhere to go.
+        """
+        next_node = self.next_node[node]
+        if next_node != -1 or not self.graph.grid[node]:
+            return next_node
+        offsets, targets, _ = self.graph.adjacency()
+        best = -1
+        for edge in range(offsets[node], offsets[node + 1]):
+            neighbour = targets[edge]
+            if self.distance[neighbour] != -1 and (best == -1 or self.distance[neighbour] < self.distance[best]):
+                best = neighbour
+        return best
+
+    def next_waypoint(self, pos):
+        """
+        Samples the field at a world space position.
+        :param pos: The position of the entity following the field.
+        :return: A Vector2 at the center of the next tile to walk to,
+                or None if the entity is at the goal or cannot reach it.
+        """
+        if self.goal == -1:
+            return None
+        tile = (pos.x // TILESIZE, pos.y // TILESIZE)
+        if not self.graph.in_bounds(tile):
+            return None
+        next_node = self.step_from(self.graph.node_id(tile))
+        if next_node == -1:
+            return None
+        x, y = self.graph.node_coords(next_node)
+        return vec((x + 0.5) * TILESIZE, (y + 0.5) * TILESIZE)
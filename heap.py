@@ -5,28 +5,28 @@
 def min_heap_push(heap, item, cost):
     """
     Inserts an item into the heap
-    and reheapifies according to min cost
+    and restores the heap property according to min cost
     :param heap: The list of items
     :param item: The item to insert
     :param cost: The item priority
     :return: None
     """
     heap.append((cost, item))
-    min_heap(heap)
+    _sift_up(heap, len(heap) - 1, _less)
 
 def min_heap_pop(heap):
     """
     Pops an item from the heap
-    and reheapifies according to
-    min cost
+    and restores the heap property
+    according to min cost
     :param heap: The list to pop an item from
-    :return: None
+    :return: The (cost, item) pair with the least cost
     """
     last_item = heap.pop()
     if heap:
         returnitem = heap[0]
         heap[0] = last_item
-        min_heap(heap)
+        _sift_down(heap, 0, _less)
         return returnitem
     return last_item
 
@@ -54,26 +54,26 @@ def min_heap(heap):
 
 def max_heap_push(heap, item, cost):
     """
-    Pushes an item into the list and reheapifies that list
+    Pushes an item into the list and restores the heap property
     :param heap: The list of items
     :param item: The item to insert
     :param cost: The item priority
     :return: None
     """
     heap.append((cost, item))
-    max_heap(heap)
+    _sift_up(heap, len(heap) - 1, _greater)
 
 def max_heap_pop(heap):
     """
-    Pops an item from the list and reheapifies that list
+    Pops an item from the list and restores the heap property
     :param heap: The list of items
-    :return: None
+    :return: The (cost, item) pair with the greatest cost
     """
     last_item = heap.pop()
     if heap:
         returnitem = heap[0]
         heap[0] = last_item
-        max_heap(heap)
+        _sift_down(heap, 0, _greater)
         return returnitem
     return last_item
 
@@ -102,3 +102,232 @@ def max_heap(heap):
         heap[key - 1] = current
 
 
+def _less(a, b):
+    return a[0] < b[0]
+
+
+def _greater(a, b):
+    return a[0] > b[0]
+
+
+def _sift_up(heap, pos, higher_priority):
+    """
+    Moves the entry at pos towards the root until its parent
+    has a higher (or equal) priority.
+    :param heap: The list of (cost, item) pairs
+    :param pos: The index of the entry to move
+    :param higher_priority: Comparison deciding which of two entries belongs closer to the root
+    :return: The final index of the entry
+    """
+    entry = heap[pos]
+    while pos > 0:
+        parent = (pos - 1) >> 1
+        if not higher_priority(entry, heap[parent]):
+            break
+        heap[pos] = heap[parent]
+        pos = parent
+    heap[pos] = entry
+    return pos
+
+
+def _sift_down(heap, pos, higher_priority):
+    """
+    Moves the entry at pos towards the leaves until both of its
+    children have a lower (or equal) priority.
+    :param heap: The list of (cost, item) pairs
+    :param pos: The index of the entry to move
+    :param higher_priority: Comparison deciding which of two entries belongs closer to the root
+    :return: The final index of the entry
+    """
+    n = len(heap)
+    entry = heap[pos]
+    child = 2 * pos + 1
+    while child < n:
+        if child + 1 < n and higher_priority(heap[child + 1], heap[child]):
+            child += 1
+        if not higher_priority(heap[child], entry):
+            break
+        heap[pos] = heap[child]
+        pos = child
+        child = 2 * pos + 1
+    heap[pos] = entry
+    return pos
+
+
+class IndexedMinHeap:
+    """
+    Min heap which remembers where every item is stored.
+    Knowing an item's position means its priority can be lowered
+    in place (decrease-key) instead of pushing a second, stale copy
+    of the item onto the heap.
+    """
+
+    def __init__(self, items=None):
+        """
+        Creates an indexed min heap.
+        :param items: Optional iterable of (cost, item) pairs to heapify
+        """
+        self.heap = []
+        self.positions = {}
+        if items:
+            self.heapify(items)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def heapify(self, items):
+        """
+        Replaces the contents of the heap with the given items
+        using a bottom-up build, which is O(n) rather than O(n log n).
+        Later duplicates of an item keep only their lowest cost.
+        :param items: Iterable of (cost, item) pairs
+        :return: None
+        """
+        best = {}
+        for cost, item in items:
+            if item not in best or cost < best[item]:
+                best[item] = cost
+        self.heap = [(cost, item) for item, cost in best.items()]
+        for pos in range(len(self.heap) // 2 - 1, -1, -1):
+            self._sift_down(pos)
+        self.positions = {item: pos for pos, (_, item) in enumerate(self.heap)}
+
+    def push(self, item, cost):
+        """
+        Inserts an item into the heap. If the item is already
+        queued with a higher cost, its cost is decreased instead.
+        :param item: The item to insert
+        :param cost: The item priority
+        :return: None
+        """
+        if item in self.positions:
+            self.decrease_key(item, cost)
+            return
+        self.heap.append((cost, item))
+        self.positions[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def decrease_key(self, item, cost):
+        """
+        Lowers the cost of an item already in the heap.
+        Requests that would raise the cost are ignored.
+        :param item: The queued item
+        :param cost: The new, lower priority
+        :return: True if the cost was lowered, False otherwise
+        """
+        pos = self.positions[item]
+        if cost >= self.heap[pos][0]:
+            return False
+        self.heap[pos] = (cost, item)
+        self._sift_up(pos)
+        return True
+
+    def update(self, item, cost):
+        """
+        Sets the cost of an item, inserting it if necessary.
+        Unlike push, the cost is allowed to increase.
+        :param item: The item to insert or update
+        :param cost: The item priority
+        :return: None
+        """
+        pos = self.positions.get(item)
+        if pos is None:
+            self.push(item, cost)
+            return
+        old_cost = self.heap[pos][0]
+        self.heap[pos] = (cost, item)
+        if cost < old_cost:
+            self._sift_up(pos)
+        else:
+            self._sift_down(pos)
+
+    def remove(self, item):
+        """
+        Removes an item from the heap if it is present.
+        :param item: The item to remove
+        :return: None
+        """
+        pos = self.positions.pop(item, None)
+        if pos is None:
+            return
+        last = self.heap.pop()
+        if pos < len(self.heap):
+            self.heap[pos] = last
+            self.positions[last[1]] = pos
+            self._sift_down(self._sift_up(pos))
+
+    def peek(self):
+        """
+        Looks at the entry with the least cost without removing it.
+        :return: The (cost, item) pair with the least cost
+        """
+        return self.heap[0]
+
+    def pop(self):
+        """
+        Removes the entry with the least cost.
+        :return: The (cost, item) pair with the least cost
+        """
+        last = self.heap.pop()
+        if not self.heap:
+            del self.positions[last[1]]
+            return last
+        top = self.heap[0]
+        del self.positions[top[1]]
+        self.heap[0] = last
+        self.positions[last[1]] = 0
+        self._sift_down(0)
+        return top
+
+    def cost(self, item):
+        """
+        Looks up the queued cost of an item.
+        :param item: The queued item
+        :return: The item's cost
+        """
+        return self.heap[self.positions[item]][0]
+
+    def clear(self):
+        """
+        Empties the heap.
+        :return: None
+        """
+        self.heap.clear()
+        self.positions.clear()
+
+    def _sift_up(self, pos):
+        heap = self.heap
+        positions = self.positions
+        entry = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if entry[0] >= heap[parent][0]:
+                break
+            heap[pos] = heap[parent]
+            positions[heap[pos][1]] = pos
+            pos = parent
+        heap[pos] = entry
+        positions[entry[1]] = pos
+        return pos
+
+    def _sift_down(self, pos):
+        heap = self.heap
+        positions = self.positions
+        n = len(heap)
+        entry = heap[pos]
+        child = 2 * pos + 1
+        while child < n:
+            if child + 1 < n and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if heap[child][0] >= entry[0]:
+                break
+            heap[pos] = heap[child]
+            positions[heap[pos][1]] = pos
+            pos = child
+            child = 2 * pos + 1
+        heap[pos] = entry
+        positions[entry[1]] = pos
+        return pos
@@ -0,0 +1,284 @@
+'''
+@author: Ned Austin Datiles
+'''
+import heap
+from pathfinding import Pathfinder
+from settings import CLUSTER_SIZE
+
+
+class HierarchicalGraph:
+    """
+    Abstract graph used for hierarchical pathfinding (HPA*).
+    The tile grid is split into square clusters. Wherever two neighbouring clusters share
+    an open stretch of border, a pair of entrance nodes is placed on either side of it, and
+    the cost between every pair of entrances inside a cluster is precomputed. Long distance
+    queries then search this much smaller graph and only the legs the mob is about to walk
+    are turned back into tiles.
+    """
+
+    def __init__(self, graph, cluster_size=CLUSTER_SIZE):
+        """
+        Creates the abstract graph for a weighted graph.
+        :param graph: The weighted tile graph.
+        :param cluster_size: How many tiles wide and tall each cluster is.
+        """
+        self.graph = graph
+        self.cluster_size = cluster_size
+        self.pathfinder = Pathfinder()
+        self.graph_version = -1
+        # Entrance node ids in each cluster
+        self.entrances = {}
+        # Abstract edges as node id -> list of (neighbour id, cost)
+        self.edges = {}
+
+    def cluster_of(self, node):
+        """
+        Finds which cluster a node belongs to.
+        :param node: The node id.
+        :return: The cluster's (column, row) tuple.
+        """
+        x, y = self.graph.node_coords(node)
+        return x // self.cluster_size, y // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        """
+        Tile bounds of a cluster.
+        :param cluster: The cluster's (column, row) tuple.
+        :return: (left, top, right, bottom) with right and bottom exclusive.
+        """
+        left = cluster[0] * self.cluster_size
+        top = cluster[1] * self.cluster_size
+        return (left, top, min(left + self.cluster_size, self.graph.width),
+                min(top + self.cluster_size, self.graph.height))
+
+    def build(self):
+        """
+        Places the entrances between clusters and precomputes
+        the intra-cluster costs between them.
+        :return: None
+        """
+        graph = self.graph
+        size = self.cluster_size
+        self.entrances = {}
+        self.edges = {}
+        for cy in range((graph.height + size - 1) // size):
+            for cx in range((graph.width + size - 1) // size):
+                self.entrances[(cx, cy)] = []
+
+        # Vertical borders, crossed by stepping right
+        for x in range(size, graph.width, size):
+            for top in range(0, graph.height, size):
+                cells = [(graph.node_id((x - 1, y)), graph.node_id((x, y)))
+                         for y in range(top, min(top + size, graph.height))]
+                self._add_entrances(cells)
+        # Horizontal borders, crossed by stepping down
+        for y in range(size, graph.height, size):
+            for left in range(0, graph.width, size):
+                cells = [(graph.node_id((x, y - 1)), graph.node_id((x, y)))
+                         for x in range(left, min(left + size, graph.width))]
+                self._add_entrances(cells)
+
+        for cluster, entrances in self.entrances.items():
+            for entrance in entrances:
+                distances = self.cluster_search(entrance, cluster)
+                for other in entrances:
+                    if other != entrance and other in distances:
+                        self.edges[entrance].append((other, distances[other]))
+        self.graph_version = graph.version
+
+    def _add_entrances(self, cells):
+        """
+        Places entrances along one border between two clusters.
+        Short open stretches get a single entrance in their middle,
+        longer ones get one at either end.
+        :param cells: List of (inside, outside) node id pairs along the border.
+        :return: None
+        """
+        grid = self.graph.grid
+        run = []
+        for inside, outside in cells + [(None, None)]:
+            if inside is not None and not grid[inside] and not grid[outside]:
+                run.append((inside, outside))
+                continue
+            if run:
+                if len(run) < 6:
+                    crossings = [run[len(run) // 2]]
+                else:
+                    crossings = [run[0], run[-1]]
+                for inside_node, outside_node in crossings:
+                    self._add_crossing(inside_node, outside_node)
+                run = []
+
+    def _add_crossing(self, first, second):
+        for node in (first, second):
+            if node not in self.edges:
+                self.edges[node] = []
+                self.entrances[self.cluster_of(node)].append(node)
+        self.edges[first].append((second, 10 + self.graph.weight(second)))
+        self.edges[second].append((first, 10 + self.graph.weight(first)))
+
+    def cluster_search(self, source, cluster, reverse=False):
+        """
+        Dijkstra search which never leaves a cluster.
+        :param source: The node id to search from.
+        :param cluster: The cluster's (column, row) tuple.
+        :param reverse: If True, costs are for walking to source rather than from it.
+        :return: Dictionary of reachable node id -> cost.
+        """
+        graph = self.graph
+        offsets, targets, costs = graph.adjacency()
+        if reverse:
+            costs = graph.reverse_costs()
+        width = graph.width
+        left, top, right, bottom = self.cluster_bounds(cluster)
+        distances = {source: 0}
+        frontier = heap.IndexedMinHeap()
+        frontier.push(source, 0)
+        while frontier:
+            current_cost, current = frontier.pop()
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[edge]
+                if not (left <= neighbour % width < right and top <= neighbour // width < bottom):
+                    continue
+                next_cost = current_cost + costs[edge]
+                if neighbour not in distances or next_cost < distances[neighbour]:
+                    distances[neighbour] = next_cost
+                    frontier.push(neighbour, next_cost)
+        return distances
+
+    def heuristic(self, a, b):
+        """
+        Octile distance between two nodes.
+        :param a: A node id.
+        :param b: Another node id.
+        :return: Integer lower bound on the cost from a to b.
+        """
+        width = self.graph.width
+        dx = abs(a % width - b % width)
+        dy = abs(a // width - b // width)
+        return 10 * max(dx, dy) + 4 * min(dx, dy)
+
+    def find_path(self, start, goal):
+        """
+        Searches the abstract graph for a route from start to goal.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A HierarchicalPath, or None if the goal cannot be reached.
+        """
+        if self.graph_version != self.graph.version:
+            self.build()
+        start_cluster = self.cluster_of(start)
+        goal_cluster = self.cluster_of(goal)
+        if start_cluster == goal_cluster or self.graph.grid[goal]:
+            # Nearby or blocked goals are searched on the tile graph straight away
+            return self.direct_route(start, goal)
+
+        # Temporarily connect start and goal to the entrances of their clusters
+        start_links = self.cluster_search(start, start_cluster)
+        start_edges = [(entrance, start_links[entrance])
+                       for entrance in self.entrances[start_cluster] if entrance in start_links]
+        goal_links = self.cluster_search(goal, goal_cluster, reverse=True)
+
+        came_from = {start: None}
+        cost = {start: 0}
+        frontier = heap.IndexedMinHeap()
+        frontier.push(start, 0)
+        while frontier:
+            current = frontier.pop()[1]
+            if current == goal:
+                break
+            neighbours = self.edges.get(current, [])
+            if current == start:
+                neighbours = neighbours + start_edges
+            if current in goal_links:
+                neighbours = neighbours + [(goal, goal_links[current])]
+            for next, edge_cost in neighbours:
+                next_cost = cost[current] + edge_cost
+                if next not in cost or next_cost < cost[next]:
+                    cost[next] = next_cost
+                    came_from[next] = current
+                    frontier.push(next, next_cost + self.heuristic(next, goal))
+
+        if goal not in came_from:
+            # Only orthogonal border crossings become entrances, so fall
+            # back to the tile graph before giving up on the goal
+            return self.direct_route(start, goal)
+
+        nodes = [goal]
+        while nodes[-1] != start:
+            nodes.append(came_from[nodes[-1]])
+        nodes.reverse()
+        # Drop the near side of every border crossing; refining to the far
+        # side walks through it anyway and saves a one tile leg
+        route = [start]
+        for node, next in zip(nodes[1:], nodes[2:]):
+            if self.cluster_of(node) == self.cluster_of(next):
+                route.append(node)
+        route.append(goal)
+        return HierarchicalPath(self, route)
+
+    def direct_route(self, start, goal):
+        """
+        Searches the tile graph for a route of a single, already refined leg.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A HierarchicalPath, or None if the goal cannot be reached.
+        """
+        leg = self.refine(start, goal)
+        if leg is None:
+            return None
+        return HierarchicalPath(self, [start, goal], [leg])
+
+    def refine(self, start, goal):
+        """
+        Turns one leg of an abstract route back into tiles.
+        :param start: The node id the leg starts at.
+        :param goal: The node id the leg ends at.
+        :return: A list of Vector2 objects from goal back to start,
+                or None if the leg cannot be walked.
+        """
+        path = self.pathfinder.search_ids(self.graph, start, goal)
+        if path is None:
+            return None
+        path.reverse()
+        return Pathfinder.to_waypoints(self.graph, path)
+
+
+class HierarchicalPath:
+    """
+    A route through the abstract graph that is refined into
+    tile waypoints one leg at a time as it is walked.
+    """
+
+    def __init__(self, hierarchy, nodes, refined=None):
+        """
+        Creates a route.
+        :param hierarchy: The HierarchicalGraph the route was found in.
+        :param nodes: The node ids the route visits, from start to goal.
+        :param refined: Optional list of the first legs, already refined.
+        """
+        self.hierarchy = hierarchy
+        self.nodes = nodes
+        self.refined = refined or []
+        self.leg = 0
+
+    def finished(self):
+        """
+        :return: True if every leg has been handed out, False otherwise.
+        """
+        return self.leg >= len(self.nodes) - 1
+
+    def next_segment(self):
+        """
+        Refines the next leg of the route.
+        :return: A list of Vector2 objects in the same order as
+                Pathfinder.a_star_search, or None if the route is finished.
+        """
+        if self.finished():
+            return None
+        start = self.nodes[self.leg]
+        goal = self.nodes[self.leg + 1]
+        self.leg += 1
+        if self.leg <= len(self.refined):
+            return self.refined[self.leg - 1]
+        return self.hierarchy.refine(start, goal)
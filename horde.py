@@ -0,0 +1,438 @@
+'''
+@author: Ned Austin Datiles
+'''
+from math import pi
+from random import choice, random
+from settings import TILESIZE, WIDTH, HEIGHT, DETECT_RADIUS, AVOID_RADIUS, WANDER_RING_DISTANCE, \
+    ENEMY_LINE_OF_SIGHT, SPATIAL_HASH_CELL_SIZE, HORDE_SYNC_MARGIN, vec
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Obstacles' hit rects are 10 pixels smaller than their tiles
+WALL_INSET = 5
+
+
+class Horde:
+    """
+    Steers and moves every mob at once.
+    Positions, velocities, accelerations and the per mob steering constants are kept
+    in contiguous NumPy arrays (one row per mob), and seeking, wandering, flocking,
+    obstacle avoidance, integration and wall collisions are computed for the whole
+    horde with array operations each frame. Sprites are only brought up to date for
+    the mobs near the camera, which are the ones that are drawn or can be hit.
+    Mobs chasing the player from afar follow the shared flow field.
+    """
+    # Names of the per mob arrays, grown together
+    ARRAYS = ('pos', 'vel', 'acc', 'speed', 'seek_force', 'wander_radius', 'separation_radius', 'half_size')
+
+    def __init__(self, game, capacity=64):
+        """
+        Creates an empty horde.
+        :param game: The game the mobs belong to.
+        :param capacity: How many mobs fit before the arrays are grown.
+        """
+        self.game = game
+        self.count = 0
+        # Row -> mob, and mob -> row
+        self.mobs = []
+        self.rows = {}
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.acc = np.zeros((capacity, 2))
+        self.speed = np.zeros(capacity)
+        self.seek_force = np.zeros(capacity)
+        self.wander_radius = np.zeros(capacity)
+        self.separation_radius = np.zeros(capacity)
+        self.half_size = np.zeros((capacity, 2))
+        self.wall_radius = max((wall.radius for wall in game.walls), default=0)
+        # Mobs whose sprites were brought up to date last frame
+        self.synced = []
+        # Flow field's next node list and its array copy
+        self.flow_source = None
+        self.flow_next = None
+
+    @staticmethod
+    def available():
+        """
+        :return: True if NumPy is installed, False otherwise.
+        """
+        return np is not None
+
+    def add(self, mob):
+        """
+        Copies a mob's state into the arrays.
+        :param mob: The mob joining the horde.
+        :return: None
+        """
+        if self.count == len(self.speed):
+            self.grow()
+        row = self.count
+        self.pos[row] = mob.pos
+        self.vel[row] = mob.vel
+        self.acc[row] = mob.acc
+        self.speed[row] = mob.speed
+        self.seek_force[row] = mob.seek_force
+        self.wander_radius[row] = mob.wander_radius
+        self.separation_radius[row] = mob.radius * 1.5
+        self.half_size[row] = (mob.hit_rect.width / 2, mob.hit_rect.height / 2)
+        self.mobs.append(mob)
+        self.rows[mob] = row
+        self.count += 1
+
+    def remove(self, mob):
+        """
+        Drops a mob from the arrays by moving the last row into its place.
+        :param mob: The mob leaving the horde.
+        :return: None
+        """
+        row = self.rows.pop(mob, None)
+        if row is None:
+            return
+        last = self.count - 1
+        if row != last:
+            for name in self.ARRAYS:
+                array = getattr(self, name)
+                array[row] = array[last]
+            moved = self.mobs[last]
+            self.mobs[row] = moved
+            self.rows[moved] = row
+        self.mobs.pop()
+        self.count -= 1
+
+    def grow(self):
+        """
+        Doubles the capacity of the arrays.
+        :return: None
+        """
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((len(array) * 2,) + array.shape[1:])
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def walls_at(self, x, y):
+        """
+        Looks up which tiles under a set of world space points are walls.
+        :param x: Array of x coordinates.
+        :param y: Array of y coordinates.
+        :return: Boolean array, True for walls and for points off the map.
+        """
+        graph = self.game.game_graph
+        column = np.floor(x / TILESIZE).astype(np.intp)
+        row = np.floor(y / TILESIZE).astype(np.intp)
+        inside = (column >= 0) & (column < graph.width) & (row >= 0) & (row < graph.height)
+        grid = np.frombuffer(graph.grid, dtype=np.uint8)
+        walls = np.ones(len(x), dtype=bool)
+        walls[inside] = grid[row[inside] * graph.width + column[inside]] != 0
+        return walls
+
+    def flow_targets(self, pos):
+        """
+        Samples the shared flow field for every mob.
+        :param pos: Array of mob positions.
+        :return: An (array of the centers of the next tiles to walk to, boolean
+                array of which mobs have one) tuple.
+        """
+        flow = self.game.flow_field
+        targets = np.zeros_like(pos)
+        if flow.goal == -1:
+            return targets, np.zeros(len(pos), dtype=bool)
+        if self.flow_source is not flow.next_node:
+            self.flow_source = flow.next_node
+            self.flow_next = np.array(flow.next_node, dtype=np.intp)
+        width = flow.graph.width
+        column = np.floor(pos[:, 0] / TILESIZE).astype(np.intp)
+        row = np.floor(pos[:, 1] / TILESIZE).astype(np.intp)
+        inside = (column >= 0) & (column < width) & (row >= 0) & (row < flow.graph.height)
+        next_node = np.full(len(pos), -1, dtype=np.intp)
+        next_node[inside] = self.flow_next[row[inside] * width + column[inside]]
+        valid = next_node != -1
+        targets[:, 0] = (next_node % width + 0.5) * TILESIZE
+        targets[:, 1] = (next_node // width + 0.5) * TILESIZE
+        return targets, valid
+
+    @staticmethod
+    def scale_to(vectors, lengths, only=None):
+        """
+        Scales rows of an array to the given lengths in place. Zero rows are left alone.
+        :param vectors: Array of vectors.
+        :param lengths: Array of lengths.
+        :param only: Boolean array of the rows to scale, or None for every row.
+        :return: None
+        """
+        norms = np.hypot(vectors[:, 0], vectors[:, 1])
+        scale = norms > 0
+        if only is not None:
+            scale &= only
+        vectors[scale] *= (lengths[scale] / norms[scale])[:, None]
+
+    def seek(self, targets, pos, vel, speed, seek_force):
+        """
+        Seek steering behaviour for every mob, as Mob.seek.
+        :param targets: Array of positions to seek.
+        :param pos: Array of mob positions.
+        :param vel: Array of mob velocities.
+        :param speed: Array of mob speeds.
+        :param seek_force: Array of mob seek forces.
+        :return: Array of steering forces.
+        """
+        desired = targets - pos
+        self.scale_to(desired, speed)
+        steer = desired - vel
+        norms = np.hypot(steer[:, 0], steer[:, 1])
+        self.scale_to(steer, seek_force, norms > seek_force)
+        return steer
+
+    def neighbour_pairs(self, pos, reach):
+        """
+        Finds the pairs of mobs that may lie within a distance of each other. Mobs are
+        sorted into square cells at least that wide, and each mob is paired with every
+        other mob in its own and the eight surrounding cells.
+        :param pos: Array of mob positions.
+        :param reach: The largest distance of interest.
+        :return: A (first, second) tuple of row index arrays.
+        """
+        size = max(SPATIAL_HASH_CELL_SIZE, reach)
+        cells = np.floor(pos / size).astype(np.intp)
+        # Pad the cells by one on every side so neighbouring keys never wrap
+        column = cells[:, 0] - cells[:, 0].min() + 1
+        row = cells[:, 1] - cells[:, 1].min() + 1
+        columns = column.max() + 2
+        key = row * columns + column
+        order = np.argsort(key, kind='stable')
+        counts = np.bincount(key, minlength=(row.max() + 2) * columns)
+        starts = np.cumsum(counts) - counts
+        everyone = np.arange(len(pos))
+        firsts = []
+        seconds = []
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                other = key + dy * columns + dx
+                count = counts[other]
+                total = count.sum()
+                if not total:
+                    continue
+                ends = np.cumsum(count)
+                within = np.arange(total) - np.repeat(ends - count, count)
+                firsts.append(np.repeat(everyone, count))
+                seconds.append(order[np.repeat(starts[other], count) + within])
+        if not firsts:
+            return everyone[:0], everyone[:0]
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        different = first != second
+        return first[different], second[different]
+
+    def flock(self, pos, vel, speed, seek_force):
+        """
+        Separation, alignment and cohesion for every mob, as Mob.flock.
+        :param pos: Array of mob positions.
+        :param vel: Array of mob velocities.
+        :param speed: Array of mob speeds.
+        :param seek_force: Array of mob seek forces.
+        :return: A (separation, alignment, cohesion) tuple of arrays of steering forces.
+        """
+        n = len(pos)
+        separation_radius = self.separation_radius[:n]
+        first, second = self.neighbour_pairs(pos, max(AVOID_RADIUS, separation_radius.max()))
+        offset = pos[first] - pos[second]
+        dist = np.hypot(offset[:, 0], offset[:, 1])
+
+        separating = (dist > 0) & (dist < separation_radius[first])
+        neighbours = first[separating]
+        count = np.bincount(neighbours, minlength=n)
+        away = offset[separating] / dist[separating][:, None]
+        separation = np.zeros_like(pos)
+        separation[:, 0] = np.bincount(neighbours, away[:, 0], n)
+        separation[:, 1] = np.bincount(neighbours, away[:, 1], n)
+        has = count > 0
+        separation[has] /= count[has][:, None]
+        has &= (separation[:, 0] != 0) | (separation[:, 1] != 0)
+        separation = separation * speed[:, None] - vel
+        separation[~has] = 0
+        self.scale_to(separation, seek_force)
+
+        close = (dist > 0) & (dist < AVOID_RADIUS)
+        neighbours = first[close]
+        others = second[close]
+        count = np.bincount(neighbours, minlength=n)
+        has = count > 0
+        alignment = np.zeros_like(pos)
+        center = np.zeros_like(pos)
+        for axis in (0, 1):
+            alignment[:, axis] = np.bincount(neighbours, vel[others, axis], n)
+            center[:, axis] = np.bincount(neighbours, pos[others, axis], n)
+        alignment[has] /= count[has][:, None]
+        center[has] /= count[has][:, None]
+        aligned = has & ((alignment[:, 0] != 0) | (alignment[:, 1] != 0))
+        alignment = alignment * speed[:, None] - vel
+        alignment[~aligned] = 0
+        self.scale_to(alignment, seek_force)
+
+        cohesion = self.seek(center, pos, vel, speed, seek_force)
+        cohesion[~(has & ((center[:, 0] != 0) | (center[:, 1] != 0)))] = 0
+        return separation, alignment, cohesion
+
+    def obstacle_avoidance(self, pos, vel, speed):
+        """
+        Obstacle avoidance for every mob, as Mob.obstacle_avoidance. Only the
+        walls in the 5x5 tiles around each mob can be close enough to matter.
+        :param pos: Array of mob positions.
+        :param vel: Array of mob velocities.
+        :param speed: Array of mob speeds.
+        :return: Array of avoidance forces.
+        """
+        n = len(pos)
+        heading = vel / np.maximum(np.hypot(vel[:, 0], vel[:, 1]), 1e-9)[:, None]
+        further_ahead = pos + heading * ENEMY_LINE_OF_SIGHT
+        ahead = pos + heading * (ENEMY_LINE_OF_SIGHT / 2)
+        tile = np.floor(pos / TILESIZE)
+        threat = np.zeros_like(pos)
+        closest = np.full(n, np.inf)
+        radius = self.wall_radius
+        graph = self.game.game_graph
+        for dy in range(-2, 3):
+            for dx in range(-2, 3):
+                center = (tile + (dx + 0.5, dy + 0.5)) * TILESIZE
+                column = tile[:, 0] + dx
+                row = tile[:, 1] + dy
+                inside = (column >= 0) & (column < graph.width) & (row >= 0) & (row < graph.height)
+                wall = self.walls_at(center[:, 0], center[:, 1]) & inside
+                near = np.zeros(n, dtype=bool)
+                for point in (ahead, further_ahead, pos):
+                    near |= np.hypot(*(center - point).T) <= radius
+                dist = np.hypot(*(center - pos).T)
+                better = wall & near & (dist < closest)
+                closest[better] = dist[better]
+                threat[better] = center[better]
+        force = further_ahead - threat
+        self.scale_to(force, speed)
+        force[np.isinf(closest)] = 0
+        return force
+
+    def collide(self, pos, vel, half_size, moving, axis):
+        """
+        Pushes mobs out of the walls they walked into along one axis and
+        turns them back, as collide_with_obstacles.
+        :param pos: Array of mob positions.
+        :param vel: Array of mob velocities.
+        :param half_size: Array of half the widths and heights of the mobs' hit rects.
+        :param moving: Boolean array of the mobs that moved.
+        :param axis: 0 for horizontal movement, 1 for vertical.
+        :return: None
+        """
+        across = 1 - axis
+        reach = half_size[:, axis] - WALL_INSET
+        side = half_size[:, across] - WALL_INSET
+        for sign in (1, -1):
+            edge = pos[:, axis] + sign * reach
+            hit = np.zeros(len(pos), dtype=bool)
+            for corner in (-1, 1):
+                other = pos[:, across] + corner * side
+                points = (edge, other) if axis == 0 else (other, edge)
+                hit |= self.walls_at(*points)
+            hit &= moving
+            face = np.floor(edge[hit] / TILESIZE) * TILESIZE
+            if sign == 1:
+                pos[hit, axis] = face - half_size[hit, axis]
+            else:
+                pos[hit, axis] = face + TILESIZE + half_size[hit, axis]
+            vel[hit, axis] = -vel[hit, axis]
+            moving = moving & ~hit
+
+    def update(self, dt):
+        """
+        Steers and moves the whole horde one frame, then brings the
+        sprites near the camera up to date.
+        :param dt: Seconds since the last frame.
+        :return: None
+        """
+        n = self.count
+        if not n:
+            return
+        game = self.game
+        pos = self.pos[:n]
+        vel = self.vel[:n]
+        acc = self.acc[:n]
+        speed = self.speed[:n]
+        seek_force = self.seek_force[:n]
+        # The game knocks back, and pauses, the mobs it can see
+        for mob in self.synced:
+            row = self.rows.get(mob)
+            if row is not None:
+                pos[row] = mob.pos
+        moving = np.fromiter((mob.can_attack for mob in self.mobs), dtype=bool, count=n)
+
+        # Mobs at rest start moving along their acceleration
+        resting = (vel[:, 0] == 0) & (vel[:, 1] == 0)
+        if resting.any():
+            vel[resting] += acc[resting] * dt
+            self.scale_to(vel, speed, resting)
+        heading = vel / np.maximum(np.hypot(vel[:, 0], vel[:, 1]), 1e-9)[:, None]
+
+        # Close mobs pursue the player, the rest follow the flow field or wander
+        prey = game.player
+        target = prey.pos if prey.vel.length() == 0 else prey.pos + prey.vel.normalize()
+        pursuing = np.hypot(*(pos - (prey.pos.x, prey.pos.y)).T) < DETECT_RADIUS
+        targets, following = self.flow_targets(pos)
+        targets[pursuing] = (target.x, target.y)
+        wandering = ~pursuing & ~following
+        count = np.count_nonzero(wandering)
+        if count:
+            angle = np.random.uniform(0, 2 * pi, count)
+            circle = pos[wandering] + heading[wandering] * WANDER_RING_DISTANCE
+            radius = self.wander_radius[:n][wandering]
+            targets[wandering] = circle + np.column_stack((np.cos(angle), np.sin(angle))) * radius[:, None]
+        acc += self.seek(targets, pos, vel, speed, seek_force)
+        acc += self.obstacle_avoidance(pos, vel, speed) * 3
+        separation, alignment, cohesion = self.flock(pos, vel, speed, seek_force)
+        acc += separation * 2
+        acc += alignment
+        acc += cohesion
+
+        vel += acc * dt
+        self.scale_to(vel, speed)
+        step = vel * dt + 0.5 * acc * dt ** 2
+        half_size = self.half_size[:n]
+        pos[moving, 0] += step[moving, 0]
+        self.collide(pos, vel, half_size, moving, 0)
+        pos[moving, 1] += step[moving, 1]
+        self.collide(pos, vel, half_size, moving, 1)
+
+        self.sync(pursuing)
+
+    def sync(self, pursuing):
+        """
+        Copies the arrays back into the sprites of the mobs near the camera, and of
+        those that just left it so they are not left behind on screen.
+        :param pursuing: Boolean array of the mobs pursuing the player.
+        :return: None
+        """
+        n = self.count
+        pos = self.pos[:n]
+        camera = self.game.camera.camera
+        left = -camera.x - HORDE_SYNC_MARGIN
+        top = -camera.y - HORDE_SYNC_MARGIN
+        visible = ((pos[:, 0] >= left) & (pos[:, 0] <= left + WIDTH + 2 * HORDE_SYNC_MARGIN) &
+                   (pos[:, 1] >= top) & (pos[:, 1] <= top + HEIGHT + 2 * HORDE_SYNC_MARGIN))
+        synced = [self.mobs[row] for row in np.flatnonzero(visible)]
+        leaving = [mob for mob in self.synced if mob in self.rows and not visible[self.rows[mob]]]
+        for mob in synced + leaving:
+            row = self.rows[mob]
+            x, y = self.pos[row]
+            mob.pos.update(x, y)
+            mob.vel.update(*self.vel[row])
+            mob.acc.update(*self.acc[row])
+            mob.hit_rect.center = (x, y)
+            mob.rect.center = mob.hit_rect.center
+            mob.is_onscreen = bool(visible[row])
+            mob.can_pursue = bool(pursuing[row])
+            if mob.is_onscreen:
+                mob.rot = mob.vel.angle_to(vec(1, 0))
+                mob.image = self.game.enemy_atlas.rotated(mob.image_index, mob.rot - 90)
+                if mob.can_pursue and random() < 0.005:
+                    choice(self.game.zombie_moan_sounds).play()
+        self.synced = synced
@@ -0,0 +1,118 @@
+'''
+@author: Ned Austin Datiles
+'''
+from array import array
+import heap
+from settings import LANDMARK_COUNT
+
+# Distance table entry for a node that cannot reach (or be reached from) a landmark
+UNREACHABLE = -1
+
+
+class Landmarks:
+    """
+    Precomputed landmark distances for the ALT (A*, landmarks, triangle inequality) heuristic.
+    A handful of landmark tiles are picked far apart from each other and the exact cost
+    between every tile and every landmark is stored. For any landmark L the triangle
+    inequality gives d(n, goal) >= d(L, goal) - d(L, n) and d(n, goal) >= d(n, L) - d(goal, L),
+    which is a far better estimate than straight line distance around long walls.
+    """
+
+    def __init__(self, graph, count=LANDMARK_COUNT):
+        """
+        Picks the landmarks and fills the distance tables for a weighted graph.
+        :param graph: The weighted graph.
+        :param count: How many landmarks to place, 0 to leave the tables empty.
+        """
+        self.graph = graph
+        self.graph_version = graph.version
+        self.nodes = []
+        # One array per landmark, indexed by node id: cost from the landmark to
+        # the node, and from the node to the landmark. Without tile weights
+        # every edge costs the same both ways and the two tables are shared.
+        self.distances_from = []
+        self.distances_to = []
+        if count:
+            self.build(count)
+
+    def build(self, count):
+        """
+        Places landmarks by repeatedly picking the open tile furthest
+        from every landmark chosen so far.
+        :param count: How many landmarks to place.
+        :return: None
+        """
+        grid = self.graph.grid
+        first = next((node for node in range(len(grid)) if not grid[node]), None)
+        if first is None:
+            return
+        # Seed with the tile furthest from an arbitrary open tile
+        closest = self.dijkstra(first)
+        for _ in range(count):
+            landmark = max(range(len(closest)), key=closest.__getitem__)
+            if closest[landmark] <= 0:
+                break
+            distances = self.dijkstra(landmark)
+            self.nodes.append(landmark)
+            self.distances_from.append(distances)
+            self.distances_to.append(self.dijkstra(landmark, True) if self.graph.weights else distances)
+            if len(self.nodes) == 1:
+                closest = array('i', distances)
+                continue
+            for node, distance in enumerate(distances):
+                if distance != UNREACHABLE and (closest[node] == UNREACHABLE or distance < closest[node]):
+                    closest[node] = distance
+
+    def dijkstra(self, source, reverse=False):
+        """
+        Finds the cost between a node and every other node.
+        :param source: The node id to search from.
+        :param reverse: If True, costs are for walking to source rather than from it.
+        :return: An array of costs indexed by node id, UNREACHABLE where there is no path.
+        """
+        graph = self.graph
+        offsets, targets, costs = graph.adjacency()
+        if reverse:
+            costs = graph.reverse_costs()
+        distances = array('i', [UNREACHABLE]) * (len(offsets) - 1)
+        distances[source] = 0
+        frontier = heap.IndexedMinHeap()
+        frontier.push(source, 0)
+        while frontier:
+            current_cost, current = frontier.pop()
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[edge]
+                next_cost = current_cost + costs[edge]
+                if distances[neighbour] == UNREACHABLE or next_cost < distances[neighbour]:
+                    distances[neighbour] = next_cost
+                    frontier.push(neighbour, next_cost)
+        return distances
+
+    def heuristic(self, goal):
+        """
+        Builds the ALT estimate of the cost to a goal.
+        :param goal: The goal node id.
+        :return: A function taking a node id and returning a lower bound on its cost to goal.
+        """
+        width = self.graph.width
+        goal_x = goal % width
+        goal_y = goal // width
+        # Only landmarks that see the goal can bound the cost to it
+        tables = [(from_landmark, from_landmark[goal], to_landmark, to_landmark[goal])
+                  for from_landmark, to_landmark in zip(self.distances_from, self.distances_to)
+                  if from_landmark[goal] != UNREACHABLE and to_landmark[goal] != UNREACHABLE]
+
+        def estimate(node):
+            dx = abs(node % width - goal_x)
+            dy = abs(node // width - goal_y)
+            best = 10 * max(dx, dy) + 4 * min(dx, dy)
+            for from_landmark, landmark_to_goal, to_landmark, goal_to_landmark in tables:
+                landmark_to_node = from_landmark[node]
+                if landmark_to_node != UNREACHABLE:
+                    if landmark_to_goal - landmark_to_node > best:
+                        best = landmark_to_goal - landmark_to_node
+                    if to_landmark[node] - goal_to_landmark > best:
+                        best = to_landmark[node] - goal_to_landmark
+            return best
+
+        return estimate
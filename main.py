@@ -10,7 +10,9 @@ from settings import WIDTH, HEIGHT, TITLE, TILESIZE, CLIP_IMG, CROSSHAIRS, \
     BAR_LENGTH, BAR_HEIGHT, GOLD, LIMEGREEN, DODGERBLUE, GREEN, DEEPSKYBLUE, BLOOD_SHADES, \
     ENEMY_KNOCKBACK, vec, PLAYER_HIT_SOUNDS, ZOMBIE_MOAN_SOUNDS, ENEMY_HIT_SOUNDS, \
     PLAYER_FOOTSTEPS, NIGHT_COLOR, LIGHT_MASK, LIGHT_RADIUS, PLAYER_SWING_NOISES, BG_MUSIC, \
-    GAME_OVER_MUSIC, MAIN_MENU_MUSIC
+    GAME_OVER_MUSIC, MAIN_MENU_MUSIC, MOB_NAVIGATION, PATH_SCHEDULING, \
+    NEXT_HOP_TABLE, NEXT_HOP_PERSIST, NAV_DATA_CACHE, SQUAD_PATHING, HORDE_ENGINE, \
+    AI_LOD
 from random import choice, randrange, random
 from player import Player
 from mobs import Mob
@@ -18,6 +20,21 @@ from tilemap import Map, Camera
 from sprites import Obstacle, WeaponPickup, MiscPickup
 from core_functions import collide_hit_rect
 from pathfinding import Pathfinder, WeightedGraph
+from flowfield import FlowField
+from hierarchical import HierarchicalGraph
+from pathcache import PathCache
+from pathservice import PathService
+from pathscheduler import PathScheduler, PathBatcher
+from nexthop import NextHopTable
+from navdata import NavData
+from navmesh import NavMesh
+from squads import SquadManager
+from spatialhash import SpatialHash
+from horde import Horde
+from wallfield import WallField
+from rotation import RotationAtlas, FrameCache
+from aischeduler import AIScheduler
+from culling import Culler
 
 
 class Game:
@@ -50,6 +67,15 @@ class Game:
         # Debugging flags
         self.debug = False
         self.hardcore_mode = False
+        # Scheduled path searches for 'path' navigation
+        self.path_service = None
+        if MOB_NAVIGATION == 'path':
+            if PATH_SCHEDULING == 'budget':
+                self.path_service = PathScheduler()
+            elif PATH_SCHEDULING == 'async':
+                self.path_service = PathService()
+            elif PATH_SCHEDULING == 'batch':
+                self.path_service = PathBatcher()
 
     def load_data(self):
         """
@@ -155,6 +181,9 @@ class Game:
         self.enemy_imgs = [pg.transform.smoothscale(pg.image.load(path.join(self.game_folder, name)),
                                                     (96, 96)).convert_alpha() for name in
                            ENEMY_IMGS]
+        # Every enemy image pre-rotated, shared by all the mobs
+        self.enemy_atlas = RotationAtlas(self.enemy_imgs)
+        self.enemy_atlas.warm()
         # Load player animations
         self.default_player_weapon = 'knife'
         self.default_player_action = 'idle'
@@ -203,6 +232,8 @@ class Game:
                                                        for name in SHOTGUN_ANIMATIONS['reload']]
         self.player_animations['shotgun']['shoot'] = [pg.image.load(path.join(self.game_folder, name)).convert_alpha()
                                                       for name in SHOTGUN_ANIMATIONS['shoot']]
+        # Recently rotated player frames
+        self.player_frames = FrameCache(self.player_animations)
 
     def new(self):
         """
@@ -214,12 +245,34 @@ class Game:
         self.bullets = pg.sprite.Group()
         self.mobs = pg.sprite.Group()
         self.items = pg.sprite.Group()
+        self.effects = pg.sprite.Group()
         self.swingAreas = pg.sprite.Group()
+        # Mobs bucketed by position for the flocking behaviours' neighbour queries
+        self.mob_grid = SpatialHash()
         self.camera = Camera(self.map.width, self.map.height)
         self.paused = False
         self.running = True
         self.pathfinder = Pathfinder()
-        self.game_graph = WeightedGraph()
+        # Precomputed navigation data is loaded from beside the map when it is up to date
+        self.nav_data = NavData.for_map(self.map) if NAV_DATA_CACHE else None
+        if self.nav_data:
+            self.game_graph = self.nav_data.make_graph()
+            self.hierarchy = self.nav_data.make_hierarchy(self.game_graph)
+        else:
+            self.game_graph = WeightedGraph.from_map(self.map)
+            self.hierarchy = HierarchicalGraph(self.game_graph)
+        self.flow_field = FlowField(self.game_graph)
+        self.navmesh = NavMesh(self.game_graph) if MOB_NAVIGATION == 'navmesh' else None
+        # Packs of mobs share their leader's path
+        self.squads = None
+        if SQUAD_PATHING and MOB_NAVIGATION in ('path', 'navmesh'):
+            self.squads = SquadManager()
+        self.path_cache = PathCache(self.game_graph)
+        # Small maps answer every path request from a precomputed table
+        self.next_hops = None
+        if MOB_NAVIGATION == 'path' and NEXT_HOP_TABLE:
+            self.next_hops = NextHopTable.for_graph(self.game_graph,
+                                                    self.map.filename + '.nexthop' if NEXT_HOP_PERSIST else None)
         mob_positions = []
         wall_positions = []
 
@@ -236,11 +289,18 @@ class Game:
 
         for position in wall_positions:
             Obstacle(self, position[0], position[1])
-
+        # Closest wall lookup for the mobs' obstacle avoidance
+        self.wall_field = WallField(self.game_graph, max((wall.radius for wall in self.walls), default=0))
+        # Works out what the camera can see each frame
+        self.culler = Culler(self)
+
+        # Mobs are steered all at once by the horde when NumPy is available
+        self.horde = Horde(self) if HORDE_ENGINE and Horde.available() else None
+        # Otherwise mobs are updated less often the further they are from the player
+        self.ai_scheduler = AIScheduler() if AI_LOD and not self.horde else None
         for position in mob_positions:
             Mob(self, position[0], position[1])
 
-        self.game_graph.walls = [(int(wall[0] // TILESIZE), int(wall[1] // TILESIZE)) for wall in wall_positions]
         self.mob_idx = 0
         self.last_queue_update = 0
         g.run()
@@ -252,9 +312,56 @@ class Game:
         :param prey: The unknowning target
         :return: A list of Vector2 objects to guide the predator
         """
-        return self.pathfinder.a_star_search(self.game_graph,
-                                             vec(predator.pos.x // TILESIZE, predator.pos.y // TILESIZE),
-                                             vec(prey.pos.x // TILESIZE, prey.pos.y // TILESIZE))
+        if self.navmesh:
+            return self.navmesh.find_path(predator.pos, prey.pos)
+        start = (predator.pos.x // TILESIZE, predator.pos.y // TILESIZE)
+        goal = (prey.pos.x // TILESIZE, prey.pos.y // TILESIZE)
+        if not self.game_graph.in_bounds(start) or not self.game_graph.in_bounds(goal):
+            return None
+        start = self.game_graph.node_id(start)
+        goal = self.game_graph.node_id(goal)
+        if self.nav_data and not self.nav_data.connected(start, goal):
+            return None
+        if self.next_hops and not self.next_hops.stale() and not self.game_graph.grid[start]:
+            path = self.next_hops.path(start, goal)
+            if path is None:
+                return None
+            if self.pathfinder.smoothing and not self.game_graph.weights:
+                path = self.pathfinder.smooth_path(self.game_graph, path)
+            path.reverse()
+            return Pathfinder.to_waypoints(self.game_graph, path)
+        # Mobs sharing a tile and chasing a still player ask the same question,
+        # so paths are served from the cache whenever possible
+        found, path = self.path_cache.lookup(start, goal)
+        if not found:
+            if self.path_service:
+                # The path is handed to the predator by deliver_paths on a later frame
+                if not self.path_service.is_pending(predator):
+                    # Mobs closest to their prey get their paths first
+                    self.path_service.submit(predator, self.game_graph, start, goal,
+                                             predator.pos.distance_squared_to(prey.pos))
+                return None
+            path = self.pathfinder.search_ids(self.game_graph, start, goal)
+            self.path_cache.store(start, goal, path)
+        if path is None:
+            return None
+        path.reverse()
+        return Pathfinder.to_waypoints(self.game_graph, path)
+
+    def find_route(self, predator, prey):
+        """
+        Finds a hierarchical route for the predator to reach its prey.
+        Only the abstract route is searched here; its legs are turned
+        into tile paths as the predator reaches them.
+        :param predator: The entity who seeks
+        :param prey: The unknowning target
+        :return: A HierarchicalPath, or None if the prey cannot be reached
+        """
+        start = (predator.pos.x // TILESIZE, predator.pos.y // TILESIZE)
+        goal = (prey.pos.x // TILESIZE, prey.pos.y // TILESIZE)
+        if not self.game_graph.in_bounds(start) or not self.game_graph.in_bounds(goal):
+            return None
+        return self.hierarchy.find_path(self.game_graph.node_id(start), self.game_graph.node_id(goal))
 
     def run(self):
         """
@@ -277,14 +384,28 @@ class Game:
         :return: None
         """
         self.impact_positions = []
+        if not self.horde:
+            self.mob_grid.rebuild(self.mobs)
+            if self.squads:
+                self.squads.update(self.mobs, self.player, pg.time.get_ticks(), self.mob_grid)
         for sprite in self.all_sprites:
             if sprite == self.player:
                 sprite.update(pg.key.get_pressed())
-            else:
+            elif not self.ai_scheduler or sprite not in self.mobs:
                 sprite.update()
+        if self.ai_scheduler:
+            self.ai_scheduler.update(self.player, self.dt)
         self.camera.update(self.player)
         self.swingAreas.update()
-        self.update_pathfinding_queue()
+        if MOB_NAVIGATION == 'flow field' or self.horde:
+            # Only recomputed when the player steps into a new tile
+            self.flow_field.update(self.player.pos)
+        if self.horde:
+            self.horde.update(self.dt)
+        elif self.path_service:
+            self.deliver_paths()
+        elif MOB_NAVIGATION in ('path', 'hierarchical'):
+            self.update_pathfinding_queue()
 
         # Player hits mobs
         hit_melee_box = pg.sprite.groupcollide(self.mobs, self.swingAreas, False, True, collide_hit_rect)
@@ -301,7 +422,9 @@ class Game:
             if hit.can_attack:
                 self.impact_positions.append(self.player.rect.center)
                 self.player.health -= hit.damage
-                hit.vel.normalize()
+                # Mobs still waiting for their first AI update are at rest
+                if hit.vel.length() > 0:
+                    hit.vel.normalize()
                 hit.pause()
                 if self.player.health <= 0:
                     self.playing = False
@@ -338,6 +461,9 @@ class Game:
             else:
                 pass
 
+        # What the camera can see is drawn, and decides which mobs are active next frame
+        self.culler.update()
+
     def events(self):
         """
         Game loop event handling
@@ -381,8 +507,8 @@ class Game:
         if self.debug:
             self.draw_grid()
         self.draw_blood_splatters()
-        # Draw all sprites to the screen
-        for sprite in self.all_sprites:
+        # Draw the sprites the camera can see to the screen
+        for sprite in self.culler.sprites:
             # if isinstance(sprite, Mob):
             #     sprite.draw_health()
             self.screen.blit(sprite.image, self.camera.apply(sprite))
@@ -547,6 +673,20 @@ class Game:
                     impact = False
             self.impact_positions.clear()
 
+    def deliver_paths(self):
+        """
+        Hands paths finished by the path scheduler or service to the
+        mobs that asked for them. Paths for mobs that have since died
+        or already found a path are only kept in the cache.
+        :return: None
+        """
+        for mob, start, goal, path in self.path_service.poll():
+            self.path_cache.store(start, goal, path)
+            if path and mob.alive() and not mob.path:
+                path.reverse()
+                mob.path = Pathfinder.to_waypoints(self.game_graph, path)
+                mob.current_path_target = len(mob.path) - 2
+
     def update_pathfinding_queue(self):
         """
         Gives each mob on the level the opportunity to find a path
@@ -597,4 +737,6 @@ if __name__ == '__main__':
         g.new()
         g.show_gameover_screen()
 
+    if g.path_service:
+        g.path_service.shutdown()
     pg.quit()
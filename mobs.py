@@ -3,12 +3,13 @@
 '''
 
 import pygame as pg
-from random import choice, uniform, random
+from random import choice, uniform, random, randrange
 from core_functions import collide_with_obstacles
 from settings import MOB_LAYER, ENEMY_HIT_RECT, ENEMY_SPEEDS, ENEMY_HEALTH, ENEMY_DAMAGE, WANDER_RING_RADIUS, \
-    SEEK_FORCE, WIDTH, HEIGHT, TILESIZE, DETECT_RADIUS, GREEN, RED, YELLOW, vec, WANDER_RING_DISTANCE, \
-    ENEMY_LINE_OF_SIGHT, AVOID_RADIUS, APPROACH_RADIUS
+    SEEK_FORCE, DETECT_RADIUS, GREEN, RED, YELLOW, vec, WANDER_RING_DISTANCE, \
+    ENEMY_LINE_OF_SIGHT, AVOID_RADIUS, APPROACH_RADIUS, MOB_NAVIGATION
 from sprites import WeaponPickup, MiscPickup
+from dstar_lite import DStarLite
 from math import sqrt
 
 
@@ -31,12 +32,14 @@ class Mob(pg.sprite.Sprite):
         self.game = game
         pg.sprite.Sprite.__init__(self, self.groups)
 
-        # Image copies are necessary because if were not
-        # for the copy, any damages pasted onto the enemy
-        # image would be replicated onto the other enemies
-        # even if they haven't been damaged
-        self.original_image = choice(game.enemy_imgs).copy()
-        self.image = self.original_image.copy()
+        # Mobs share their image and its rotated frames in the
+        # game's rotation atlas. draw_health copies the frame
+        # before pasting damage onto it, otherwise the damage
+        # would be replicated onto the other enemies even if
+        # they haven't been damaged
+        self.image_index = randrange(len(game.enemy_imgs))
+        self.original_image = game.enemy_imgs[self.image_index]
+        self.image = self.original_image
         self.rect = self.image.get_rect()
         self.rect.center = vec(x, y)
 
@@ -71,6 +74,18 @@ class Mob(pg.sprite.Sprite):
         self.path = None
         self.current_path_target = 0
         self.can_find_path = False
+        # Next tile to walk to when navigating by the shared flow field
+        self.flow_target = None
+        # Incremental path planner, created the first time it is needed
+        self.planner = None
+        # Hierarchical route whose legs are refined into paths as they are reached
+        self.route = None
+        # Squad whose leader's path this mob follows, if any
+        self.squad = None
+        if game.horde:
+            game.horde.add(self)
+        if game.ai_scheduler:
+            game.ai_scheduler.add(self)
 
     def track_prey(self, target):
         """
@@ -78,13 +93,55 @@ class Mob(pg.sprite.Sprite):
         :param target: The mob's prey.
         :return:
         """
-        if self.can_find_path and not self.path:
+        if MOB_NAVIGATION == 'flow field':
+            self.flow_target = self.game.flow_field.next_waypoint(self.pos)
+            return
+        if MOB_NAVIGATION == 'incremental':
+            if self.pos.distance_to(target.pos) > DETECT_RADIUS:
+                if self.planner is None:
+                    self.planner = DStarLite(self.game.game_graph)
+                # The planner hands back the same list until the mob or
+                # its prey changes tile, so progress along it is kept
+                path = self.planner.plan(self.pos, target.pos)
+                if path is not self.path:
+                    self.path = path
+                    if self.path:
+                        self.current_path_target = len(self.path) - 2
+            return
+        if MOB_NAVIGATION == 'hierarchical' and self.route and not self.path:
+            self.follow_next_leg()
+            return
+        if self.squad and self.squad.follows(self):
+            # Followers steer off their leader's path instead of searching for their own
+            return
+        # With a path scheduler or service, or on a navmesh where searches
+        # are cheap, every mob may ask for a path, otherwise mobs wait for
+        # their turn in the pathfinding queue
+        if (self.can_find_path or self.game.path_service or self.game.navmesh) and not self.path:
             dist = self.pos.distance_to(self.game.player.pos)
             if dist > DETECT_RADIUS * 2 and uniform(0, 1) <= .75:
+                if MOB_NAVIGATION == 'hierarchical':
+                    self.route = self.game.find_route(self, target)
+                    self.follow_next_leg()
+                    return
                 self.path = self.game.find_path(self, target)
                 if self.path:
                     self.current_path_target = len(self.path) - 2
 
+    def follow_next_leg(self):
+        """
+        Refines the next leg of this mob's hierarchical route into a path.
+        Legs are only refined once the previous one has been walked.
+        :return: None
+        """
+        if not self.route:
+            return
+        self.path = self.route.next_segment()
+        if self.route.finished():
+            self.route = None
+        if self.path:
+            self.current_path_target = len(self.path) - 2
+
     def pause(self):
         """
         Slows down the attacks of mobs
@@ -94,12 +151,13 @@ class Mob(pg.sprite.Sprite):
         self.can_attack = False
         self.last_attack_time = pg.time.get_ticks()
 
-    def move_from_rest(self):
+    def move_from_rest(self, dt):
         """
         Moves the mob from rest
+        :param dt: Seconds the mob is being updated by
         :return: None
         """
-        self.vel += self.acc * self.game.dt
+        self.vel += self.acc * dt
         self.vel.scale_to_length(self.speed)
 
     def seek(self, target):
@@ -135,13 +193,14 @@ class Mob(pg.sprite.Sprite):
             steer.scale_to_length(self.seek_force)
         return steer
 
-    def wander(self):
+    def wander(self, dt):
         """
         Gives a mob the ability to wander its environment
+        :param dt: Seconds the mob is being updated by
         :return: None
         """
         if self.vel.length() == 0:
-            self.move_from_rest()
+            self.move_from_rest(dt)
         circle_pos = self.pos + self.vel.normalize() * WANDER_RING_DISTANCE
         target = circle_pos + vec(self.wander_radius, 0).rotate(uniform(0, 360))
         return self.seek(target)
@@ -158,99 +217,76 @@ class Mob(pg.sprite.Sprite):
             target = prey.pos + prey.vel.normalize()
         return self.seek(target)
 
-    def cohesion(self):
-        """
-        Cohesion steering behaviour. This steer's a mob towards the
-        center of its neighbours.
-        :return: Vector2 object to steer towards
-        """
-        sum = vec(0, 0)
-        count = 0
-        for mob in self.game.mobs:
-            if mob != self:
-                dist = self.pos.distance_to(mob.pos)
-                if 0 < dist < AVOID_RADIUS:
-                    sum += mob.pos
-                    count += 1
-        if count > 0:
-            sum /= count
-            if sum.length() == 0:
-                return vec(0, 0)
-            return self.seek(sum)
-        else:
-            return vec(0, 0)
-
-    def align(self):
-        """
-        Alignment steering behaviour. This steer's a mob in the same direction as
-        its neighbours.
-        :return: Vector2 object to steer towards
-        """
-        sum = vec(0, 0)
-        count = 0
-        for mob in self.game.mobs:
-            if mob != self:
-                dist = self.pos.distance_to(mob.pos)
-                if 0 < dist < AVOID_RADIUS:
-                    sum += mob.vel
-                    count += 1
-        if count > 0:
-            sum /= count
-            if sum.length() == 0:
-                return vec(0, 0)
-            sum.normalize()
-            sum *= self.speed
-            steer = sum - self.vel
-            steer.scale_to_length(self.seek_force)
-            return steer
-        else:
-            return vec(0, 0)
-
-    def separation(self):
-        """
-        Gives this mob the ability to avoid
-        collisions with other obstacles
+    def flock(self):
+        """
+        Separation, alignment and cohesion in a single pass over this mob's
+        neighbours. Every neighbour is visited (and its distance measured)
+        once and the sums are kept in plain numbers rather than building a
+        vector per neighbour.
+        :return: A (separation, alignment, cohesion) tuple of Vector2 steering forces.
+        """
+        pos = self.pos
+        x, y = pos.x, pos.y
+        separation_radius = self.radius * 1.5
+        separation_x = separation_y = 0.0
+        separation_count = 0
+        velocity_x = velocity_y = 0.0
+        position_x = position_y = 0.0
+        neighbour_count = 0
+        for mob in self.game.mob_grid.query(pos, max(AVOID_RADIUS, separation_radius)):
+            if mob is not self:
+                other = mob.pos
+                dist = pos.distance_to(other)
+                if dist <= 0:
+                    continue
+                if dist < separation_radius:
+                    # Every neighbour that is too close pushes this mob directly
+                    # away from it with the same unit strength
+                    inverse = 1 / dist
+                    separation_x += (x - other.x) * inverse
+                    separation_y += (y - other.y) * inverse
+                    separation_count += 1
+                if dist < AVOID_RADIUS:
+                    velocity = mob.vel
+                    velocity_x += velocity.x
+                    velocity_y += velocity.y
+                    position_x += other.x
+                    position_y += other.y
+                    neighbour_count += 1
+
+        separation = vec(0, 0)
+        if separation_count > 0:
+            inverse = 1 / separation_count
+            steer = vec(separation_x * inverse, separation_y * inverse)
+            if steer.length() != 0:
+                steer *= self.speed
+                separation = steer - self.vel
+                separation.scale_to_length(self.seek_force)
+        alignment = vec(0, 0)
+        cohesion = vec(0, 0)
+        if neighbour_count > 0:
+            inverse = 1 / neighbour_count
+            steer = vec(velocity_x * inverse, velocity_y * inverse)
+            if steer.length() != 0:
+                steer *= self.speed
+                alignment = steer - self.vel
+                alignment.scale_to_length(self.seek_force)
+            center = vec(position_x * inverse, position_y * inverse)
+            if center.length() != 0:
+                cohesion = self.seek(center)
+        return separation, alignment, cohesion
+
+    def apply_flock(self, dt):
+        """
+        Adds the obstacle avoidance and flocking forces to the mob's acceleration.
+        :param dt: Seconds the mob is being updated by
         :return: None
         """
-        sum = vec(0, 0)
-        count = 0
-        for mob in self.game.mobs:
-            if mob != self:
-                dist = self.pos.distance_to(mob.pos)
-                if 0 < dist < self.radius * 1.5:
-                    diff = self.pos - mob.pos
-                    diff.normalize()
-                    diff /= dist
-                    sum += diff
-                    count += 1
-        if count > 0:
-            sum /= count
-            if sum.length() == 0:
-                return vec(0, 0)
-            sum.normalize()
-            sum *= self.speed
-            steer = sum - self.vel
-            steer.scale_to_length(self.seek_force)
-            return steer
-        else:
-            return vec(0, 0)
-
-    @staticmethod
-    def find_collision(obs, ahead, further_ahead, pos):
-        """
-        Checks to see if there is potential for a collision with
-        the observered object.
-        :param obs: The object under consideration.
-        :param ahead: Secondary line of sight.
-        :param further_ahead: Main line of sight.
-        :param pos: The mob's position
-        :return: True if there is a potential collision False otherwise
-        """
-        obs_center = vec(obs.rect.center)
-        d1 = obs_center.distance_to(ahead)
-        d2 = obs_center.distance_to(further_ahead)
-        d3 = obs_center.distance_to(pos)
-        return (d1 <= obs.radius) or (d2 <= obs.radius) or (d3 <= obs.radius)
+        self.acc += self.obstacle_avoidance(dt) * 3
+        separation, alignment, cohesion = self.flock()
+        self.acc += separation * 2
+        self.acc += alignment
+        self.acc += cohesion
 
     def find_most_threatening_obstacle(self, ahead, further_ahead, pos):
         """
@@ -261,23 +297,19 @@ class Mob(pg.sprite.Sprite):
         :return: Vector2 object containing the location of the most
                 threatening obstacle in the mob's path.
         """
-        most_threatening = None
-        for wall in self.game.walls:
-            collide = self.find_collision(wall, ahead, further_ahead, pos)
-            if collide and (not most_threatening or self.pos.distance_to(wall.rect.center) < self.pos.distance_to(
-                    most_threatening)):
-                most_threatening = wall.pos
-        return most_threatening
+        # The wall field answers in constant time instead of checking every wall
+        return self.game.wall_field.most_threatening(pos, (ahead, further_ahead, pos))
 
-    def obstacle_avoidance(self):
+    def obstacle_avoidance(self, dt):
         """
         Gives a mob the ability to avoid obstacles in the path its
         currently walking.
+        :param dt: Seconds the mob is being updated by
         :return: Vector2 object representing the force needed to avoid
                 a potential collision.
         """
         if self.vel.length() == 0:
-            self.move_from_rest()
+            self.move_from_rest(dt)
         further_ahead = self.pos + self.vel.normalize() * ENEMY_LINE_OF_SIGHT
         ahead = self.pos + self.vel.normalize() * ENEMY_LINE_OF_SIGHT / 2
         most_threatening = self.find_most_threatening_obstacle(ahead, further_ahead, self.pos)
@@ -288,46 +320,39 @@ class Mob(pg.sprite.Sprite):
             avoidance_force.scale_to_length(self.speed)
         return avoidance_force
 
-    def apply_flocking_behaviour(self):
+    def apply_flocking_behaviour(self, dt):
         """
         Applies flcoking steering behaviours to the mob
+        :param dt: Seconds the mob is being updated by
         :return: None
         """
-        self.acc += self.obstacle_avoidance() * 3
-        self.acc += self.separation() * 2
-        self.acc += self.align()
-        self.acc += self.cohesion()
+        self.apply_flock(dt)
 
-    def apply_pursuing_behaviour(self):
+    def apply_pursuing_behaviour(self, dt):
         """
         Allows the mob to pursue the target
+        :param dt: Seconds the mob is being updated by
         :return:
         """
         self.acc += self.pursue(self.game.player)
-        self.acc += self.obstacle_avoidance() * 3
-        self.acc += self.separation() * 2
-        self.acc += self.align()
-        self.acc += self.cohesion()
+        self.apply_flock(dt)
 
-    def apply_wandering_behaviour(self):
+    def apply_wandering_behaviour(self, dt):
         """
         Gives a mob the ability to wander the around.
+        :param dt: Seconds the mob is being updated by
         :return:
         """
-        self.acc += self.wander()
-        self.acc += self.obstacle_avoidance() * 3
-        self.acc += self.separation() * 2
-        self.acc += self.align()
-        self.acc += self.cohesion()
+        self.acc += self.wander(dt)
+        self.apply_flock(dt)
 
     def check_if_is_on_screen(self):
         """
-        Used to check if this mob is on the screen or not
-        :return: True if on the screen, False otherwise
+        Used to check if this mob is near enough to the screen to be
+        active or not, as decided by the game's culling
+        :return: True if active, False otherwise
         """
-        location = vec(self.game.camera.apply_rect(self.hit_rect.copy()).center)
-        # location = vec(self.hit_rect.x + self.game.camera.camera.x, self.hit_rect.y + self.game.camera.camera.y)
-        if location.x <= WIDTH + 2 * TILESIZE and location.y <= HEIGHT + 2 * TILESIZE:
+        if self.game.culler.is_active(self):
             if self.pos.distance_to(self.game.player.pos) < DETECT_RADIUS:
                 self.can_pursue = True
             else:
@@ -362,43 +387,67 @@ class Mob(pg.sprite.Sprite):
             self.path = None
             return vec(0, 0)
 
-    def update(self):
+    def update(self, dt=None):
         """
         Update this mob's internal state
+        :param dt: Seconds to advance the mob by, the game's dt by default
         :return: None
         """
-        self.check_if_is_on_screen()
+        if dt is None:
+            dt = self.game.dt
+        horde = self.game.horde
+        if not horde:
+            self.check_if_is_on_screen()
         if self.health <= 0:
             if uniform(0, 1) < .015:
                 self.drop_item()
             self.kill()
-        if self.is_onscreen:
+            self.game.mob_grid.remove(self)
+            if horde:
+                horde.remove(self)
+        if horde:
+            # The horde steers and moves every mob at once
+            self.recover()
+        elif self.is_onscreen:
             self.track_prey(self.game.player)
             if self.pos.distance_to(self.game.player.pos) < DETECT_RADIUS:
                 if random() < 0.005:
                     choice(self.game.zombie_moan_sounds).play()
-                self.apply_pursuing_behaviour()
+                self.apply_pursuing_behaviour(dt)
             elif self.path:
                 self.acc += self.follow_path()
-                self.apply_flocking_behaviour()
+                self.apply_flocking_behaviour(dt)
+            elif self.flow_target:
+                self.acc += self.seek(self.flow_target)
+                self.apply_flocking_behaviour(dt)
+            elif self.squad and self.squad.follows(self) and self.squad.waypoint():
+                self.acc += self.seek(self.squad.waypoint())
+                self.apply_flocking_behaviour(dt)
             else:
                 if self.is_onscreen:
-                    self.apply_wandering_behaviour()
-            self.vel += self.acc * self.game.dt
+                    self.apply_wandering_behaviour(dt)
+            self.vel += self.acc * dt
             self.vel.scale_to_length(self.speed)
             if self.can_attack:
-                self.pos += self.vel * self.game.dt + 0.5 * self.acc * self.game.dt ** 2
+                self.pos += self.vel * dt + 0.5 * self.acc * dt ** 2
                 self.hit_rect.centerx = self.pos.x
                 collide_with_obstacles(self, self.game.walls, 'x')
                 self.hit_rect.centery = self.pos.y
                 collide_with_obstacles(self, self.game.walls, 'y')
             self.rot = self.vel.angle_to(vec(1, 0))
-            self.image = pg.transform.rotozoom(self.original_image, self.rot - 90, 1).copy()
+            self.image = self.game.enemy_atlas.rotated(self.image_index, self.rot - 90)
             self.rect.center = self.hit_rect.center
-            now = pg.time.get_ticks()
-            if now - self.last_attack_time > 750:
-                self.can_attack = True
-                self.last_attack_time = now
+            self.recover()
+
+    def recover(self):
+        """
+        Lets the mob attack again once it has been paused long enough
+        :return: None
+        """
+        now = pg.time.get_ticks()
+        if now - self.last_attack_time > 750:
+            self.can_attack = True
+            self.last_attack_time = now
 
     def draw_health(self):
         """
@@ -418,4 +467,5 @@ class Mob(pg.sprite.Sprite):
         self.health_bar = pg.Rect(self.hit_rect.width // 3, 0, width, 7)
 
         if self.health < ENEMY_HEALTH[0]:
+            self.image = self.image.copy()
             pg.draw.rect(self.image, color, self.health_bar)
@@ -0,0 +1,256 @@
+'''
+@author: Ned Austin Datiles
+'''
+import hashlib
+import mmap
+import struct
+from array import array
+from collections import deque
+from os import path
+from hierarchical import HierarchicalGraph
+from landmarks import Landmarks
+from pathfinding import WeightedGraph
+from settings import CLUSTER_SIZE, LANDMARK_COUNT
+
+# Bump whenever the layout of the file or of any section changes
+FORMAT_VERSION = 1
+# magic, format version, map content hash, width, height, cluster size, landmark count, section count
+HEADER = struct.Struct('<4sH40sIIIII')
+# tag, byte length
+SECTION = struct.Struct('<4sQ')
+MAGIC = b'NAVD'
+
+
+def content_hash(tile_map):
+    """
+    Hash of a map's layout.
+    :param tile_map: The Map object.
+    :return: The hex digest of the map's rows.
+    """
+    return hashlib.sha1('\n'.join(tile_map.data).encode()).hexdigest()
+
+
+class NavData:
+    """
+    Navigation data derived from a map: the occupancy grid, region ids (which connected
+    area each tile belongs to), landmark distances and the hierarchical cluster graph.
+    It is built once and saved in a binary sidecar file beside the map, stamped with a
+    hash of the map's contents. Later launches memory-map the file instead of rebuilding
+    anything, and it is only rebuilt when the map (or the file format or settings) changes.
+    """
+
+    def __init__(self, width, height, cluster_size, sections):
+        """
+        Wraps the sections of a nav data file.
+        :param width: How many tiles wide the map is.
+        :param height: How many tiles tall the map is.
+        :param cluster_size: Cluster size of the hierarchical graph.
+        :param sections: Dictionary of section tag -> memoryview.
+        """
+        self.width = width
+        self.height = height
+        self.cluster_size = cluster_size
+        self.grid = sections[b'GRID']
+        self.regions = sections[b'REGN'].cast('i')
+        self.landmarks = sections[b'LMRK'].cast('i')
+        self.clusters = sections[b'CLST'].cast('i')
+        self.graph = None
+        self.graph_version = -1
+
+    @classmethod
+    def for_map(cls, tile_map, filename=None, cluster_size=CLUSTER_SIZE, landmark_count=LANDMARK_COUNT):
+        """
+        Loads a map's nav data file, building (and saving) it if it is missing or out of date.
+        :param tile_map: The Map object.
+        :param filename: The sidecar file, by default the map's file name with '.nav' added.
+        :param cluster_size: Cluster size of the hierarchical graph.
+        :param landmark_count: How many landmarks to place.
+        :return: A NavData object.
+        """
+        if filename is None:
+            filename = tile_map.filename + '.nav'
+        key = (content_hash(tile_map), tile_map.tilewidth, tile_map.tileheight, cluster_size, landmark_count)
+        nav_data = cls.load(filename, key)
+        if nav_data is None:
+            data = cls.build(tile_map, cluster_size, landmark_count)
+            try:
+                with open(filename, 'wb') as file:
+                    file.write(data)
+                nav_data = cls.load(filename, key)
+            except OSError:
+                pass
+            if nav_data is None:
+                nav_data = cls.parse(memoryview(data), key)
+        return nav_data
+
+    @classmethod
+    def build(cls, tile_map, cluster_size=CLUSTER_SIZE, landmark_count=LANDMARK_COUNT):
+        """
+        Computes the nav data for a map.
+        :param tile_map: The Map object.
+        :param cluster_size: Cluster size of the hierarchical graph.
+        :param landmark_count: How many landmarks to place.
+        :return: The contents of a nav data file as bytes.
+        """
+        graph = WeightedGraph.from_map(tile_map)
+        offsets, targets, _ = graph.adjacency()
+
+        # Flood fill the connected areas of the map
+        regions = array('i', [-1]) * len(graph.grid)
+        region = 0
+        for node, cell in enumerate(graph.grid):
+            if cell or regions[node] != -1:
+                continue
+            regions[node] = region
+            frontier = deque([node])
+            while frontier:
+                current = frontier.popleft()
+                for neighbour in targets[offsets[current]:offsets[current + 1]]:
+                    if regions[neighbour] == -1:
+                        regions[neighbour] = region
+                        frontier.append(neighbour)
+            region += 1
+
+        # Maps have no tile weights, so one table per landmark works both ways
+        landmarks = Landmarks(graph, landmark_count)
+        landmark_data = array('i', landmarks.nodes)
+        for distances in landmarks.distances_from:
+            landmark_data.extend(distances)
+
+        # Cluster graph as entrance ids followed by their edges in compressed rows
+        hierarchy = HierarchicalGraph(graph, cluster_size)
+        hierarchy.build()
+        entrances = list(hierarchy.edges)
+        cluster_offsets = array('i', [0])
+        cluster_targets = array('i')
+        cluster_costs = array('i')
+        for entrance in entrances:
+            for neighbour, cost in hierarchy.edges[entrance]:
+                cluster_targets.append(neighbour)
+                cluster_costs.append(cost)
+            cluster_offsets.append(len(cluster_targets))
+        cluster_data = array('i', [len(entrances), len(cluster_targets)]) + array('i', entrances)
+        cluster_data += cluster_offsets + cluster_targets + cluster_costs
+
+        sections = [(b'GRID', bytes(graph.grid)), (b'REGN', regions.tobytes()),
+                    (b'LMRK', landmark_data.tobytes()), (b'CLST', cluster_data.tobytes())]
+        data = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, content_hash(tile_map).encode(), graph.width,
+                                     graph.height, cluster_size, landmark_count, len(sections)))
+        for tag, section in sections:
+            data += SECTION.pack(tag, len(section))
+            data += section
+            # Keep every section 4 byte aligned
+            data += bytes(-len(data) % 4)
+        return bytes(data)
+
+    @classmethod
+    def load(cls, filename, key):
+        """
+        Memory-maps a nav data file.
+        :param filename: The sidecar file.
+        :param key: (content hash, width, height, cluster size, landmark count) the file must match.
+        :return: A NavData object, or None if the file is missing or out of date.
+        """
+        if not path.isfile(filename):
+            return None
+        with open(filename, 'rb') as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file
+                return None
+        return cls.parse(memoryview(data), key)
+
+    @classmethod
+    def parse(cls, data, key):
+        """
+        Splits the contents of a nav data file into its sections without copying them.
+        :param data: A memoryview of the file's contents.
+        :param key: (content hash, width, height, cluster size, landmark count) the file must match.
+        :return: A NavData object, or None if the contents are out of date or malformed.
+        """
+        if len(data) < HEADER.size:
+            return None
+        magic, version, digest, width, height, cluster_size, landmark_count, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return None
+        if (digest.decode(errors='replace'), width, height, cluster_size, landmark_count) != key:
+            return None
+        sections = {}
+        offset = HEADER.size
+        for _ in range(count):
+            if offset + SECTION.size > len(data):
+                return None
+            tag, length = SECTION.unpack_from(data, offset)
+            offset += SECTION.size
+            if offset + length > len(data):
+                return None
+            sections[tag] = data[offset:offset + length]
+            offset += length + (-(offset + length) % 4)
+        if any(tag not in sections for tag in (b'GRID', b'REGN', b'LMRK', b'CLST')):
+            return None
+        return cls(width, height, cluster_size, sections)
+
+    def make_graph(self):
+        """
+        Creates the weighted graph described by the nav data, with its
+        landmark tables already in place.
+        :return: A new WeightedGraph.
+        """
+        graph = WeightedGraph(self.width, self.height)
+        graph.load_grid(self.grid)
+        size = len(graph.grid)
+        count = len(self.landmarks) // (size + 1)
+        landmarks = Landmarks(graph, 0)
+        landmarks.nodes = list(self.landmarks[:count])
+        for landmark in range(count):
+            start = count + landmark * size
+            landmarks.distances_from.append(self.landmarks[start:start + size])
+        landmarks.distances_to = landmarks.distances_from
+        graph.use_landmarks(landmarks)
+        self.graph = graph
+        self.graph_version = graph.version
+        return graph
+
+    def make_hierarchy(self, graph):
+        """
+        Creates the hierarchical graph described by the nav data.
+        :param graph: The graph returned by make_graph.
+        :return: A HierarchicalGraph whose cluster graph is already built.
+        """
+        hierarchy = HierarchicalGraph(graph, self.cluster_size)
+        size = hierarchy.cluster_size
+        for cy in range((graph.height + size - 1) // size):
+            for cx in range((graph.width + size - 1) // size):
+                hierarchy.entrances[(cx, cy)] = []
+        clusters = self.clusters
+        count, edge_count = clusters[0], clusters[1]
+        entrances = clusters[2:2 + count]
+        offsets = clusters[2 + count:3 + 2 * count]
+        targets = clusters[3 + 2 * count:3 + 2 * count + edge_count]
+        costs = clusters[3 + 2 * count + edge_count:3 + 2 * count + 2 * edge_count]
+        for index, entrance in enumerate(entrances):
+            hierarchy.entrances[hierarchy.cluster_of(entrance)].append(entrance)
+            hierarchy.edges[entrance] = [(targets[edge], costs[edge])
+                                         for edge in range(offsets[index], offsets[index + 1])]
+        hierarchy.graph_version = graph.version
+        return hierarchy
+
+    def stale(self):
+        """
+        :return: True if the graph made from the nav data has changed since, False otherwise.
+        """
+        return self.graph is None or self.graph.version != self.graph_version
+
+    def connected(self, start, goal):
+        """
+        Checks whether two tiles lie in the same connected area of the map.
+        :param start: A node id.
+        :param goal: Another node id.
+        :return: False if there is certainly no path between them, True otherwise.
+        """
+        if self.stale():
+            return True
+        start_region = self.regions[start]
+        goal_region = self.regions[goal]
+        return start_region == -1 or goal_region == -1 or start_region == goal_region
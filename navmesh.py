@@ -0,0 +1,297 @@
+'''
+@author: Ned Austin Datiles
+'''
+from array import array
+from bisect import bisect_right
+from math import hypot
+import heap
+from settings import TILESIZE, NAVMESH_AGENT_RADIUS, vec
+
+
+class NavMesh:
+    """
+    Navigation mesh made of open rectangles.
+    The mesh covers the space an agent's center can reach without its hit rect touching
+    a wall: every wall tile grown by the agent's radius on each side is left out. Each
+    tile is split into bands at the radius from its edges, so that space is made up of
+    whole cells, and runs of open cells are greedily merged into the largest rectangles
+    that fit. A room becomes a single node instead of hundreds of tiles. Rectangles
+    sharing an edge are joined by a portal (the shared stretch of edge). Routes are
+    searched over the rectangles and then pulled taut through their portals with the
+    funnel algorithm, giving world space waypoints only where the route has to turn.
+    """
+
+    def __init__(self, graph, agent_radius=NAVMESH_AGENT_RADIUS):
+        """
+        Builds the mesh for a graph's occupancy grid.
+        :param graph: The graph whose walls the mesh is built around.
+        :param agent_radius: Half the width of the agents' hit rects, and so how far routes
+                keep from walls. Less than half a tile, so that one tile wide corridors stay open.
+        """
+        self.graph = graph
+        self.agent_radius = agent_radius
+        # Where each tile is split into bands, as offsets from its top left corner
+        self.bands = sorted({0, agent_radius, TILESIZE - agent_radius})
+        self.graph_version = -1
+        # World space position of the left (top) edge of every column (row) of cells,
+        # followed by the right (bottom) edge of the map
+        self.column_edges = None
+        self.row_edges = None
+        # (left, top, right, bottom) of every rectangle in cells, right and bottom exclusive
+        self.rects = []
+        # Rectangle index of every cell, -1 for cells too close to a wall
+        self.rect_of = None
+        # Portals of every rectangle as lists of (neighbour index, (x, y), (x, y)),
+        # the end points being world space corners of the shared edge
+        self.portals = []
+        self.build()
+
+    def build(self):
+        """
+        Merges the open cells into rectangles and connects them with portals.
+        :return: None
+        """
+        bands = self.bands
+        count = len(bands)
+        self.column_edges = [x * TILESIZE + band for x in range(self.graph.width) for band in bands]
+        self.column_edges.append(self.graph.width * TILESIZE)
+        self.row_edges = [y * TILESIZE + band for y in range(self.graph.height) for band in bands]
+        self.row_edges.append(self.graph.height * TILESIZE)
+        width = self.graph.width * count
+        height = self.graph.height * count
+        grid = self._blocked_cells()
+        rect_of = array('i', [-1]) * len(grid)
+        rects = []
+        for node in range(len(grid)):
+            if grid[node] or rect_of[node] != -1:
+                continue
+            left = node % width
+            top = node // width
+            right = left
+            while right < width and not grid[top * width + right] and rect_of[top * width + right] == -1:
+                right += 1
+            bottom = top + 1
+            while bottom < height and all(not grid[bottom * width + x] and rect_of[bottom * width + x] == -1
+                                          for x in range(left, right)):
+                bottom += 1
+            for y in range(top, bottom):
+                for x in range(left, right):
+                    rect_of[y * width + x] = len(rects)
+            rects.append((left, top, right, bottom))
+
+        portals = [[] for _ in rects]
+        for index, (left, top, right, bottom) in enumerate(rects):
+            # Right and bottom edges only, each portal is added to both of its rectangles
+            if right < width:
+                self._add_portals(index, [(right, y) for y in range(top, bottom)], rect_of, portals, True)
+            if bottom < height:
+                self._add_portals(index, [(x, bottom) for x in range(left, right)], rect_of, portals, False)
+        self.rects = rects
+        self.rect_of = rect_of
+        self.portals = portals
+        self.graph_version = self.graph.version
+
+    def _blocked_cells(self):
+        """
+        Marks the cells an agent's center cannot be in: those inside walls, and those
+        within the agent's radius of a wall, which for a square hit rect are the bands
+        along the sides and corners of a tile that touch a wall or the edge of the map.
+        :return: A bytearray with one entry per cell, 1 for blocked cells.
+        """
+        graph = self.graph
+        bands = self.bands + [TILESIZE]
+        radius = self.agent_radius
+        count = len(self.bands)
+        # Which side of the tile, if any, each band is close enough to for a wall there to block it
+        sides = []
+        for band in range(count):
+            sides.append([side for side, near in ((-1, bands[band + 1] <= radius),
+                                                  (1, bands[band] >= TILESIZE - radius)) if near] + [0])
+        def is_wall(x, y):
+            return not graph.in_bounds((x, y)) or graph.grid[graph.node_id((x, y))]
+
+        width = graph.width * count
+        blocked = bytearray(width * graph.height * count)
+        for node, cell in enumerate(graph.grid):
+            x, y = graph.node_coords(node)
+            for row in range(count):
+                for column in range(count):
+                    blocked[(y * count + row) * width + x * count + column] = cell or any(
+                        is_wall(x + dx, y + dy) for dy in sides[row] for dx in sides[column] if dx or dy)
+        return blocked
+
+    def _add_portals(self, index, cells, rect_of, portals, vertical):
+        width = len(self.column_edges) - 1
+        xs = self.column_edges
+        ys = self.row_edges
+        run_start = None
+        neighbour = -1
+        for cell in cells + [None]:
+            current = rect_of[cell[1] * width + cell[0]] if cell is not None else -1
+            if current != neighbour or cell is None:
+                if neighbour != -1:
+                    last = previous
+                    a = (xs[run_start[0]], ys[run_start[1]])
+                    if vertical:
+                        b = (xs[last[0]], ys[last[1] + 1])
+                    else:
+                        b = (xs[last[0] + 1], ys[last[1]])
+                    portals[index].append((neighbour, a, b))
+                    portals[neighbour].append((index, a, b))
+                run_start = cell
+                neighbour = current
+            previous = cell
+
+    def locate(self, pos):
+        """
+        Finds the rectangle containing a world space position. A position too close
+        to a wall, or inside one, is placed in the rectangle at the middle of its
+        tile or of a tile next to it, if there is one.
+        :param pos: The world space position.
+        :return: The rectangle's index, or -1 if there is none.
+        """
+        graph = self.graph
+        bands = self.bands
+        count = len(bands)
+        width = graph.width * count
+        x = int(pos[0] // TILESIZE)
+        y = int(pos[1] // TILESIZE)
+        if graph.in_bounds((x, y)):
+            column = x * count + bisect_right(bands, pos[0] - x * TILESIZE) - 1
+            row = y * count + bisect_right(bands, pos[1] - y * TILESIZE) - 1
+            index = self.rect_of[row * width + column]
+            if index != -1:
+                return index
+        middle = bisect_right(bands, TILESIZE / 2) - 1
+        for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)):
+            if graph.in_bounds((x + dx, y + dy)):
+                index = self.rect_of[((y + dy) * count + middle) * width + (x + dx) * count + middle]
+                if index != -1:
+                    return index
+        return -1
+
+    def find_corridor(self, start, goal, start_pos, goal_pos):
+        """
+        A* search over the rectangles. Each rectangle is entered at the middle of
+        the portal it was reached through, which is where its cost is measured from.
+        :param start: The starting rectangle index.
+        :param goal: The ending rectangle index.
+        :param start_pos: World space position the route starts at.
+        :param goal_pos: World space position the route ends at.
+        :return: A list of rectangle indices from start to goal, or None.
+        """
+        entry = {start: (start_pos[0], start_pos[1])}
+        cost = {start: 0}
+        came_from = {start: -1}
+        frontier = heap.IndexedMinHeap()
+        frontier.push(start, 0)
+        while frontier:
+            current = frontier.pop()[1]
+            if current == goal:
+                break
+            x, y = entry[current]
+            for next, a, b in self.portals[current]:
+                middle = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+                next_cost = cost[current] + hypot(middle[0] - x, middle[1] - y)
+                if next not in cost or next_cost < cost[next]:
+                    cost[next] = next_cost
+                    came_from[next] = current
+                    entry[next] = middle
+                    frontier.push(next, next_cost + hypot(goal_pos[0] - middle[0], goal_pos[1] - middle[1]))
+        if goal not in came_from:
+            return None
+        corridor = [goal]
+        while corridor[-1] != start:
+            corridor.append(came_from[corridor[-1]])
+        corridor.reverse()
+        return corridor
+
+    def portal_between(self, first, second):
+        """
+        Finds the portal from one rectangle into a neighbouring one, ordered as
+        (left, right) when looking from first into second. The mesh already keeps
+        the agent's radius from walls, so the whole portal can be walked through.
+        :param first: The rectangle being left.
+        :param second: The rectangle being entered.
+        :return: A ((x, y), (x, y)) tuple of the portal's left and right ends.
+        """
+        for neighbour, a, b in self.portals[first]:
+            if neighbour == second:
+                break
+        # a is the top or left end of the portal. With y pointing down, the top end is on
+        # the left when walking right, and the right end is on the left when walking up.
+        left, top, right, bottom = self.rects[first]
+        if a[0] == b[0]:
+            return (a, b) if a[0] >= self.column_edges[right] else (b, a)
+        return (b, a) if a[1] >= self.row_edges[bottom] else (a, b)
+
+    @staticmethod
+    def funnel(start_pos, goal_pos, portals):
+        """
+        Pulls a route taut through a sequence of portals (the simple stupid funnel algorithm).
+        :param start_pos: World space position the route starts at.
+        :param goal_pos: World space position the route ends at.
+        :param portals: List of (left, right) portal ends along the route.
+        :return: A list of (x, y) world space points from start to goal.
+        """
+        def area(a, b, c):
+            # Positive when c is to the right of the line from a to b (with y pointing down)
+            return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+        portals = portals + [(goal_pos, goal_pos)]
+        points = [start_pos]
+        apex = left = right = start_pos
+        apex_index = left_index = right_index = 0
+        index = 0
+        while index < len(portals):
+            next_left, next_right = portals[index]
+            # Tighten the right side of the funnel
+            if area(apex, right, next_right) <= 0:
+                if apex == right or area(apex, left, next_right) > 0:
+                    right = next_right
+                    right_index = index
+                else:
+                    # The right side crossed the left one, so the left end becomes a corner
+                    points.append(left)
+                    apex = right = left
+                    apex_index = right_index = left_index
+                    index = apex_index + 1
+                    continue
+            # Tighten the left side of the funnel
+            if area(apex, left, next_left) >= 0:
+                if apex == left or area(apex, right, next_left) < 0:
+                    left = next_left
+                    left_index = index
+                else:
+                    points.append(right)
+                    apex = left = right
+                    apex_index = left_index = right_index
+                    index = apex_index + 1
+                    continue
+            index += 1
+        if points[-1] != goal_pos:
+            points.append(goal_pos)
+        return points
+
+    def find_path(self, start_pos, goal_pos):
+        """
+        Finds a route between two world space positions.
+        :param start_pos: The position of the entity who seeks.
+        :param goal_pos: The position of its target.
+        :return: A list of Vector2 objects from the goal back to the
+                start, in the same order as Pathfinder.a_star_search,
+                or None if the goal cannot be reached.
+        """
+        if self.graph_version != self.graph.version:
+            self.build()
+        start = self.locate(start_pos)
+        goal = self.locate(goal_pos)
+        if start == -1 or goal == -1:
+            return None
+        corridor = self.find_corridor(start, goal, start_pos, goal_pos)
+        if corridor is None:
+            return None
+        portals = [self.portal_between(first, second) for first, second in zip(corridor, corridor[1:])]
+        points = self.funnel((start_pos[0], start_pos[1]), (goal_pos[0], goal_pos[1]), portals)
+        points.reverse()
+        return [vec(point) for point in points]
@@ -0,0 +1,164 @@
+'''
+@author: Ned Austin Datiles
+'''
+import hashlib
+from array import array
+from os import path
+import heap
+from settings import NEXT_HOP_MAX_TILES
+
+# Table entry for a pair of tiles with no path between them
+NO_PATH = 0xFFFF
+# Header of a saved table: magic, format version
+MAGIC = b'NHOP'
+FORMAT_VERSION = 1
+
+
+class NextHopTable:
+    """
+    All-pairs next hop table for small maps.
+    Every open tile is given a compact index and, for every goal, the open tile to
+    step into next from every other open tile is stored as an unsigned 16 bit index,
+    so a path is read off the table one tile at a time without any searching.
+    The table takes (open tiles)^2 * 2 bytes, so it is only built for maps up to a
+    size threshold.
+    """
+
+    def __init__(self, graph):
+        """
+        Creates an empty table for a weighted graph. Use build or load to fill it.
+        :param graph: The weighted graph.
+        """
+        self.graph = graph
+        self.graph_version = graph.version
+        # Compact index -> node id, and node id -> compact index (NO_PATH for walls).
+        # Node ids run up to the size of the grid, so only the compact indices are 16 bit
+        self.nodes = array('I', (node for node, cell in enumerate(graph.grid) if not cell))
+        self.index = array('H', [NO_PATH]) * len(graph.grid)
+        for compact, node in enumerate(self.nodes):
+            self.index[node] = compact
+        # Row per goal: hops[goal * count + source] is the compact index to step into
+        self.hops = None
+
+    @classmethod
+    def for_graph(cls, graph, filename=None, max_tiles=NEXT_HOP_MAX_TILES):
+        """
+        Loads a saved table for a graph, building (and saving) it if there is none.
+        :param graph: The weighted graph.
+        :param filename: Where the table is saved, or None to never save it.
+        :param max_tiles: The most open tiles a table is built for.
+        :return: A NextHopTable, or None if the graph has too many open tiles.
+        """
+        if len(graph.grid) - sum(graph.grid) > min(max_tiles, NO_PATH):
+            return None
+        table = cls(graph)
+        if filename is None or not table.load(filename):
+            table.build()
+            if filename is not None:
+                table.save(filename)
+        return table
+
+    def stale(self):
+        """
+        :return: True if the graph has changed since the table was made, False otherwise.
+        """
+        return self.graph.version != self.graph_version
+
+    def build(self):
+        """
+        Fills the table with one Dijkstra search back from every open tile.
+        :return: None
+        """
+        graph = self.graph
+        offsets, targets, _ = graph.adjacency()
+        reverse_costs = graph.reverse_costs()
+        nodes = self.nodes
+        index = self.index
+        count = len(nodes)
+        self.hops = hops = array('H', [NO_PATH]) * (count * count)
+        cost = [0] * len(index)
+        stamp = [-1] * len(index)
+        frontier = heap.IndexedMinHeap()
+        for goal, goal_node in enumerate(nodes):
+            row = goal * count
+            hops[row + goal] = goal
+            stamp[goal_node] = goal
+            cost[goal_node] = 0
+            frontier.push(goal_node, 0)
+            while frontier:
+                current_cost, current = frontier.pop()
+                for edge in range(offsets[current], offsets[current + 1]):
+                    neighbour = targets[edge]
+                    next_cost = current_cost + reverse_costs[edge]
+                    if stamp[neighbour] != goal or next_cost < cost[neighbour]:
+                        stamp[neighbour] = goal
+                        cost[neighbour] = next_cost
+                        hops[row + index[neighbour]] = index[current]
+                        frontier.push(neighbour, next_cost)
+
+    def path(self, start, goal):
+        """
+        Reads a path off the table.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A list of node ids from start to goal, or None if there is
+                no path or either node is a wall.
+        """
+        source = self.index[start]
+        target = self.index[goal]
+        if source == NO_PATH or target == NO_PATH:
+            return None
+        hops = self.hops
+        nodes = self.nodes
+        row = target * len(nodes)
+        path = [start]
+        while source != target:
+            source = hops[row + source]
+            if source == NO_PATH:
+                return None
+            path.append(nodes[source])
+        return path
+
+    def content_hash(self):
+        """
+        Hash of everything the table depends on.
+        :return: The hex digest of the graph's size, walls and weights.
+        """
+        graph = self.graph
+        digest = hashlib.sha1()
+        digest.update(b'%d %d ' % (graph.width, graph.height))
+        digest.update(bytes(graph.grid))
+        digest.update(repr(sorted(graph.weights.items())).encode())
+        return digest.hexdigest()
+
+    def save(self, filename):
+        """
+        Writes the table to a file.
+        :param filename: The file to write.
+        :return: None
+        """
+        with open(filename, 'wb') as file:
+            file.write(MAGIC + bytes([FORMAT_VERSION]))
+            file.write(self.content_hash().encode())
+            self.hops.tofile(file)
+
+    def load(self, filename):
+        """
+        Reads a table written by save, provided it was made for this graph.
+        :param filename: The file to read.
+        :return: True if the table was loaded, False otherwise.
+        """
+        if not path.isfile(filename):
+            return False
+        with open(filename, 'rb') as file:
+            if file.read(len(MAGIC) + 1) != MAGIC + bytes([FORMAT_VERSION]):
+                return False
+            if file.read(40).decode(errors='replace') != self.content_hash():
+                return False
+            hops = array('H')
+            try:
+                hops.fromfile(file, len(self.nodes) ** 2)
+            except EOFError:
+                return False
+        self.hops = hops
+        return True
@@ -0,0 +1,97 @@
+'''
+@author: Ned Austin Datiles
+'''
+from collections import OrderedDict
+from settings import PATH_CACHE_SIZE
+
+
+class PathCache:
+    """
+    Bounded least-recently-used cache of paths keyed on (start, goal) node ids.
+    Paths are also reused for a different start tile when a cached path to the
+    same goal already passes through it, since every tail of a path found by the
+    search is a path to the same goal. The whole cache is dropped as soon as the
+    graph's walls change.
+    """
+
+    def __init__(self, graph, size=PATH_CACHE_SIZE, reuse_subpaths=True):
+        """
+        Creates an empty path cache. Callers search for the paths it misses and store them.
+        :param graph: The weighted graph paths are found on.
+        :param size: The most paths kept at once.
+        :param reuse_subpaths: Whether to answer from the tail of a cached path.
+        """
+        self.graph = graph
+        self.size = size
+        self.reuse_subpaths = reuse_subpaths
+        self.graph_version = graph.version
+        # (start, goal) -> tuple of node ids from start to goal, or None if unreachable
+        self.entries = OrderedDict()
+        # goal -> set of cached keys ending at that goal
+        self.by_goal = {}
+        self.hits = 0
+        self.subpath_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def clear(self):
+        """
+        Empties the cache without resetting its counters.
+        :return: None
+        """
+        self.entries.clear()
+        self.by_goal.clear()
+
+    def lookup(self, start, goal):
+        """
+        Looks up a path without searching for it.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A (found, path) tuple. path is a list of node ids from
+                start to goal, or None if the goal is known to be unreachable.
+        """
+        if self.graph_version != self.graph.version:
+            self.clear()
+            self.graph_version = self.graph.version
+            self.invalidations += 1
+
+        key = (start, goal)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            path = self.entries[key]
+            return True, list(path) if path is not None else None
+
+        if self.reuse_subpaths:
+            for cached in self.by_goal.get(goal, ()):
+                path = self.entries[cached]
+                if path is not None and start in path:
+                    self.entries.move_to_end(cached)
+                    self.subpath_hits += 1
+                    return True, list(path[path.index(start):])
+
+        self.misses += 1
+        return False, None
+
+    def store(self, start, goal, path):
+        """
+        Adds a path to the cache, evicting the least recently used paths if it is full.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param path: A list of node ids from start to goal, or None if unreachable.
+        :return: None
+        """
+        if self.graph_version != self.graph.version:
+            return
+        key = (start, goal)
+        self.entries[key] = tuple(path) if path is not None else None
+        self.entries.move_to_end(key)
+        self.by_goal.setdefault(goal, set()).add(key)
+        while len(self.entries) > self.size:
+            old_key, _ = self.entries.popitem(last=False)
+            keys = self.by_goal[old_key[1]]
+            keys.discard(old_key)
+            if not keys:
+                del self.by_goal[old_key[1]]
+            self.evictions += 1
@@ -2,7 +2,10 @@
 @author: Ned Austin Datiles
 '''
 import heap
-from settings import GRIDWIDTH, GRIDHEIGHT, TILESIZE, vec
+from math import hypot
+from landmarks import Landmarks
+from settings import GRIDWIDTH, GRIDHEIGHT, TILESIZE, SEARCH_MODE, SEARCH_HEURISTIC, PATH_SMOOTHING, \
+    LANDMARK_COUNT, vec
 
 
 class Graph:
@@ -13,16 +16,105 @@ class Graph:
     and there are edges between nodes iff two nodes are both passable and contained in the graph.
     """
 
-    def __init__(self):
+    def __init__(self, width=GRIDWIDTH, height=GRIDHEIGHT):
         """
         Creates a new graph.
+        :param width: How many tiles wide the graph is.
+        :param height: How many tiles tall the graph is.
         """
-        self.height = GRIDHEIGHT
-        self.width = GRIDWIDTH
-        self.walls = []
+        self.height = height
+        self.width = width
+        # Flat row-major occupancy grid, one byte per tile (1 = wall)
+        self.grid = bytearray(width * height)
+        # Bumped whenever the occupancy grid changes so that
+        # anything derived from it knows when to rebuild
+        self.version = 0
         self.connections = [vec(1, 0), vec(-1, 0), vec(0, 1), vec(0, -1)]
         self.connections += [vec(1, 1), vec(-1, 1), vec(1, -1), vec(-1, -1)]
 
+    @classmethod
+    def from_map(cls, tile_map):
+        """
+        Creates a graph sized to a tile map with its walls already placed.
+        :param tile_map: The Map object to build the graph from.
+        :return: A new graph.
+        """
+        graph = cls(tile_map.tilewidth, tile_map.tileheight)
+        graph.load_map(tile_map.data)
+        return graph
+
+    def load_map(self, data):
+        """
+        Fills the occupancy grid from the rows of a map file.
+        :param data: List of strings where '1' marks a wall tile.
+        :return: None
+        """
+        self.grid = bytearray(self.width * self.height)
+        for row, tiles in enumerate(data[:self.height]):
+            offset = row * self.width
+            for col, tile in enumerate(tiles[:self.width]):
+                if tile == '1':
+                    self.grid[offset + col] = 1
+        self.version += 1
+
+    def load_grid(self, grid):
+        """
+        Replaces the occupancy grid with a precomputed one.
+        :param grid: Bytes-like object of width * height cells (1 = wall).
+        :return: None
+        """
+        self.grid = bytearray(grid)
+        self.version += 1
+
+    @property
+    def walls(self):
+        """
+        The wall tiles of the graph.
+        :return: A list of (x, y) tuples.
+        """
+        return [(idx % self.width, idx // self.width) for idx, cell in enumerate(self.grid) if cell]
+
+    @walls.setter
+    def walls(self, walls):
+        self.grid = bytearray(self.width * self.height)
+        for wall in walls:
+            self.add_wall(wall)
+        self.version += 1
+
+    def add_wall(self, node):
+        """
+        Marks a node as impassable.
+        :param node: The node to block.
+        :return: None
+        """
+        self.grid[int(node[1]) * self.width + int(node[0])] = 1
+        self.version += 1
+
+    def remove_wall(self, node):
+        """
+        Marks a node as passable.
+        :param node: The node to clear.
+        :return: None
+        """
+        self.grid[int(node[1]) * self.width + int(node[0])] = 0
+        self.version += 1
+
+    def node_id(self, node):
+        """
+        Converts tile coordinates into a flat index into the occupancy grid.
+        :param node: The node as a Vector2 or (x, y) tuple.
+        :return: Integer node id.
+        """
+        return int(node[1]) * self.width + int(node[0])
+
+    def node_coords(self, node_id):
+        """
+        Converts a flat node id back into tile coordinates.
+        :param node_id: Integer node id.
+        :return: An (x, y) tuple.
+        """
+        return node_id % self.width, node_id // self.width
+
     def in_bounds(self, node):
         """
         Determines whether or not a given node is contained in the graph by checking to see
@@ -30,16 +122,59 @@ class Graph:
         :param node: The node under consideration
         :return: True if the graph contains, False otherwise.
         """
-        return 0 <= node.x < self.width and 0 <= node.y < self.height
+        return 0 <= node[0] < self.width and 0 <= node[1] < self.height
 
     def passable(self, node):
         """
         Determines if a node is passable or not. Passable here means that
         there does not exist an obstacle at position the node represents.
         :param node: The node under consideration.
-        :return: True if the node is not passable, False otherwise.
+        :return: True if the node is passable, False otherwise.
         """
-        return node not in self.walls
+        return not self.grid[int(node[1]) * self.width + int(node[0])]
+
+    def line_of_sight(self, a, b):
+        """
+        Walks every tile the straight line between the centres of two
+        nodes passes through. Where the line passes exactly through a
+        corner, both tiles touching that corner have to be open.
+        :param a: A node id.
+        :param b: Another node id.
+        :return: True if no wall is in the way, False otherwise.
+        """
+        grid = self.grid
+        width = self.width
+        if grid[a] or grid[b]:
+            return False
+        x, y = a % width, a // width
+        dx = b % width - x
+        dy = b // width - y
+        step_x = 1 if dx > 0 else -1
+        step_y = width if dy > 0 else -width
+        dx = abs(dx)
+        dy = abs(dy)
+        node = a
+        error = dx - dy
+        remaining = dx + dy
+        dx *= 2
+        dy *= 2
+        while remaining > 0:
+            if error > 0:
+                node += step_x
+                error -= dy
+            elif error < 0:
+                node += step_y
+                error += dx
+            else:
+                if grid[node + step_x] or grid[node + step_y]:
+                    return False
+                node += step_x + step_y
+                error += dx - dy
+                remaining -= 1
+            remaining -= 1
+            if grid[node]:
+                return False
+        return True
 
     def find_neighbors(self, node):
         """
@@ -62,12 +197,36 @@ class WeightedGraph(Graph):
     Gives weights to the edges among neighbouring nodes.
     """
 
-    def __init__(self):
+    def __init__(self, width=GRIDWIDTH, height=GRIDHEIGHT):
         """
         Creates a weighted graph.
+        :param width: How many tiles wide the graph is.
+        :param height: How many tiles tall the graph is.
         """
-        super().__init__()
+        super().__init__(width, height)
         self.weights = {}
+        self._adjacency = None
+        self._reverse_costs = None
+        self._adjacency_version = -1
+        self._landmarks = None
+
+    def set_weight(self, node, weight):
+        """
+        Sets the extra cost of travelling into a node.
+        :param node: The node as an (x, y) tuple.
+        :param weight: The additional cost.
+        :return: None
+        """
+        self.weights[(int(node[0]), int(node[1]))] = weight
+        self.version += 1
+
+    def weight(self, node_id):
+        """
+        Looks up the extra cost of travelling into a node.
+        :param node_id: Integer node id.
+        :return: The node's weight, 0 if it has none.
+        """
+        return self.weights.get(self.node_coords(node_id), 0) if self.weights else 0
 
     def cost(self, start, end):
         """
@@ -78,39 +237,114 @@ class WeightedGraph(Graph):
         :param end: Another node.
         :return: An integer representing the cost of the edge.
         """
-        if (vec(end) - vec(start)).length_squared() == 1:
+        if abs(end[0] - start[0]) + abs(end[1] - start[1]) == 1:
             return self.weights.get(end, 0) + 10
         else:
             return self.weights.get(end, 0) + 14
 
+    def adjacency(self):
+        """
+        Compressed sparse row view of the graph's edges, built once and
+        reused until the graph changes. The neighbours of node id n are
+        targets[offsets[n]:offsets[n + 1]] with matching edge costs in costs.
+        :return: A tuple of (offsets, targets, costs) lists.
+        """
+        if self._adjacency_version != self.version:
+            self._build_adjacency()
+        return self._adjacency
+
+    def reverse_costs(self):
+        """
+        Edge costs for searches that work backwards from a goal, matching adjacency().
+        reverse_costs()[edge] is the cost of walking the edge the other way, from
+        the edge's target back into the node whose neighbours it is listed with.
+        :return: A list of edge costs.
+        """
+        if self._adjacency_version != self.version:
+            self._build_adjacency()
+        return self._reverse_costs
+
+    def landmarks(self, count=LANDMARK_COUNT):
+        """
+        Landmark distance tables for the ALT heuristic, built once and
+        reused until the graph changes.
+        :param count: How many landmarks to place.
+        :return: A Landmarks object.
+        """
+        if self._landmarks is None or self._landmarks.graph_version != self.version:
+            self._landmarks = Landmarks(self, count)
+        return self._landmarks
+
+    def use_landmarks(self, landmarks):
+        """
+        Installs precomputed landmark tables, such as ones loaded from a nav data file.
+        They are used until the graph changes.
+        :param landmarks: A Landmarks object made for this graph.
+        :return: None
+        """
+        self._landmarks = landmarks
+
+    def _build_adjacency(self):
+        width = self.width
+        height = self.height
+        grid = self.grid
+        steps = [(int(c.x), int(c.y)) for c in self.connections]
+        offsets = [0]
+        targets = []
+        costs = []
+        reverse_costs = []
+        # Walls keep their outgoing edges so that a search starting
+        # from an entity pushed into a wall tile can still escape it
+        for node_id in range(width * height):
+            x = node_id % width
+            y = node_id // width
+            weight = self.weights.get((x, y), 0)
+            for dx, dy in steps:
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    neighbour = ny * width + nx
+                    if not grid[neighbour]:
+                        step = 14 if dx and dy else 10
+                        targets.append(neighbour)
+                        costs.append(self.weights.get((nx, ny), 0) + step)
+                        reverse_costs.append(weight + step)
+            offsets.append(len(targets))
+        self._adjacency = offsets, targets, costs
+        self._reverse_costs = reverse_costs
+        self._adjacency_version = self.version
+
 
 class PriorityQueue:
     """
     Priority Queue implementation.
-    Uses a heap for efficiency.
+    Uses an indexed heap so that re-queuing a node with a cheaper
+    cost updates its existing entry instead of adding a duplicate.
     """
 
     def __init__(self):
         """
         Creates an empty priority queue
         """
-        self.nodes = []
+        self.nodes = heap.IndexedMinHeap()
 
     def put(self, node, cost):
         """
         Inserts a node with a cost to reach that node.
+        If the node is already queued, its cost is lowered
+        when the new cost is cheaper.
         :param node: The node travelled to.
         :param cost: The cost to travel to that node.
         :return: None
         """
-        heap.min_heap_push(heap=self.nodes, item=node, cost=cost)
+        self.nodes.push(node, cost)
 
     def get(self):
         """
         Retrieves the node with the least cost to travel to.
         :return: Tuple containing the coordinates to travel to.
         """
-        return heap.min_heap_pop(heap=self.nodes)[1]
+        return self.nodes.pop()[1]
 
     def empty(self):
         """
@@ -125,13 +359,80 @@ class Pathfinder:
     Finds a path from point A to point B
     """
 
-    def __init__(self):
+    def __init__(self, mode=SEARCH_MODE, smoothing=PATH_SMOOTHING, heuristic=SEARCH_HEURISTIC):
         """
         Creates a new pathfinder.
+        :param mode: Which search find_path uses, 'a*', 'jps' or 'theta*'.
+        :param smoothing: Whether paths are reduced to their turning points.
+        :param heuristic: Which estimate A* uses, 'manhattan', 'octile' or 'landmarks'.
         """
+        self.mode = mode
+        self.smoothing = smoothing
+        self.heuristic = heuristic
         self.frontier = PriorityQueue()
-        self.path = {}
-        self.cost = {}
+        # Per-node search state indexed by node id. An entry is only
+        # meaningful when its stamp matches the current search, which
+        # lets the lists be reused between searches without clearing them.
+        self.path = []
+        self.cost = []
+        self.stamp = []
+        self.search_id = 0
+        # Wall-padded copy of the grid used by jump point search
+        self.padded = None
+        self.padded_key = None
+
+    def reset(self, size):
+        """
+        Prepares the search state for a new search.
+        :param size: The number of nodes in the graph being searched.
+        :return: None
+        """
+        if len(self.stamp) != size:
+            self.path = [-1] * size
+            self.cost = [0] * size
+            self.stamp = [0] * size
+            self.search_id = 0
+        self.search_id += 1
+        self.frontier = PriorityQueue()
+
+    def find_path(self, graph, start, end):
+        """
+        Finds a path using the search selected by this pathfinder's mode.
+        :param graph: The graph under consideration.
+        :param start: The starting node in the graph
+        :param end: The ending node in the graph.
+        :return: A list of Vector2 objects indicating the path
+                from end back to start.
+        """
+        if not graph.in_bounds(start) or not graph.in_bounds(end):
+            return None
+        path = self.search_ids(graph, graph.node_id(start), graph.node_id(end))
+        if path is None:
+            return None
+        path.reverse()
+        return self.to_waypoints(graph, path)
+
+    def search_ids(self, graph, start, goal):
+        """
+        Runs the search selected by this pathfinder's mode over node ids.
+        Jump point search, Theta* and smoothing rely on every step costing
+        the same, so graphs with tile weights always use plain A*.
+        :param graph: The weighted graph under consideration.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A list of node ids from start to goal, or None.
+        """
+        if graph.weights:
+            return self.a_star_search_ids(graph, start, goal)
+        if self.mode == 'theta*':
+            return self.theta_star_search_ids(graph, start, goal)
+        if self.mode == 'jps':
+            path = self.jump_point_search_ids(graph, start, goal)
+        else:
+            path = self.a_star_search_ids(graph, start, goal)
+        if self.smoothing and path:
+            path = self.smooth_path(graph, path)
+        return path
 
     def a_star_search(self, graph, start, end):
         """
@@ -140,64 +441,505 @@ class Pathfinder:
         :param start: The starting node in the graph
         :param end: The ending node in the graph.
         :return: A list of Vector2 objects indicating the path
-                from start to end.
-        """
-
-        def heuristic(a, b):
-            """
-            Manhattan distance heuristic.
-            :param a: Initial point
-            :param b: Final point
-            :return: Integer presenting the manhattan distance from a to b
-            """
-            return (abs(a.x - b.x) + abs(a.y - b.y)) * 10
-
-        def vector_to_tuple(v):
-            """
-            Converts a vector into a tuple.
-            :param v: The vector to convert
-            :return: A tuple of the vector's x and y (x, y)
-            """
-            return (int(v.x), int(v.y))
-
-        def construct_path(came_from, start, goal):
-            """
-            Constructs the path by adding onto start, all vectors
-            that belong on the path.
-            :param came_from: The dictionary of traversed nodes.
-            :param start: The initial node.
-            :param goal: The final node.
-            :return: A list of Vector2 objects representing the path
-                    from start to goal.
-            """
-            current = start
-            path = [vec(current.x * TILESIZE, current.y * TILESIZE)]
-            while current != goal:
-                current = current + came_from[vector_to_tuple(current)]
-                path.append(vec(current.x * TILESIZE, current.y * TILESIZE))
-            return path
+                from end back to start.
+        """
+        if not graph.in_bounds(start) or not graph.in_bounds(end):
+            return None
+        path = self.a_star_search_ids(graph, graph.node_id(start), graph.node_id(end))
+        if path is None:
+            return None
+        path.reverse()
+        return self.to_waypoints(graph, path)
 
-        self.frontier = PriorityQueue()
-        self.frontier.put(vector_to_tuple(start), 0)
-        self.path = {}
-        self.cost = {}
-        self.path[vector_to_tuple(start)] = None
-        self.cost[vector_to_tuple(start)] = 0
-        goal = vector_to_tuple(end)
-        while not self.frontier.empty():
-            current = self.frontier.get()
+    def a_star_search_ids(self, graph, start, goal):
+        """
+        A* search over integer node ids using the graph's precomputed
+        adjacency, so that no vectors are created while searching.
+        :param graph: The weighted graph under consideration.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A list of node ids from start to goal, or None if
+                the goal cannot be reached.
+        """
+        offsets, targets, costs = graph.adjacency()
+        self.reset(len(offsets) - 1)
+        came_from = self.path
+        cost = self.cost
+        stamp = self.stamp
+        search_id = self.search_id
+        frontier = self.frontier.nodes
+        estimate = self.estimate(graph, goal, self.heuristic)
+
+        stamp[start] = search_id
+        cost[start] = 0
+        came_from[start] = -1
+        frontier.push(start, 0)
+        while frontier:
+            current = frontier.pop()[1]
             if current == goal:
                 break
-            for next in graph.find_neighbors(vec(current)):
-                next = vector_to_tuple(next)
-                next_cost = self.cost[current] + graph.cost(current, next)
-                if next not in self.cost or next_cost < self.cost[next]:
-                    self.cost[next] = next_cost
-                    priority = next_cost + heuristic(end, vec(next))
-                    self.frontier.put(next, priority)
-                    self.path[next] = vec(current) - vec(next)
+            current_cost = cost[current]
+            for edge in range(offsets[current], offsets[current + 1]):
+                next = targets[edge]
+                next_cost = current_cost + costs[edge]
+                if stamp[next] != search_id or next_cost < cost[next]:
+                    stamp[next] = search_id
+                    cost[next] = next_cost
+                    came_from[next] = current
+                    frontier.push(next, next_cost + estimate(next))
         # Checks to see if there is actually a path from start to end
         # and builds the path if there is.
-        if vector_to_tuple(end) in self.path:
-            return construct_path(self.path, end, start)
-        return None
+        if stamp[goal] != search_id:
+            return None
+        return self.construct_path(start, goal)
+
+    def batch_search_ids(self, graph, starts, goal):
+        """
+        Finds paths from many starting nodes to one goal with a single search.
+        A Dijkstra search is grown backwards from the goal until every start
+        has been settled, after which each path is read off the same predecessor
+        map, so a horde chasing the player costs one search instead of one each.
+        :param graph: The weighted graph under consideration.
+        :param starts: An iterable of starting node ids.
+        :param goal: The ending node id.
+        :return: A dictionary of start node id -> list of node ids from
+                start to goal, or None for the starts the goal cannot be reached from.
+        """
+        offsets, targets, costs = graph.adjacency()
+        reverse_costs = graph.reverse_costs()
+        self.reset(len(offsets) - 1)
+        next_node = self.path
+        cost = self.cost
+        stamp = self.stamp
+        search_id = self.search_id
+        frontier = self.frontier.nodes
+        grid = graph.grid
+        starts = set(starts)
+
+        # Walls have no incoming edges, so a start that has been pushed into
+        # a wall waits on its open neighbours and steps out through the best one
+        unsettled = set()
+        for start in starts:
+            if grid[start]:
+                unsettled.update(targets[offsets[start]:offsets[start + 1]])
+            else:
+                unsettled.add(start)
+
+        if not grid[goal]:
+            stamp[goal] = search_id
+            cost[goal] = 0
+            next_node[goal] = -1
+            frontier.push(goal, 0)
+        while frontier and unsettled:
+            current_cost, current = frontier.pop()
+            unsettled.discard(current)
+            for edge in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[edge]
+                next_cost = current_cost + reverse_costs[edge]
+                if stamp[neighbour] != search_id or next_cost < cost[neighbour]:
+                    stamp[neighbour] = search_id
+                    cost[neighbour] = next_cost
+                    next_node[neighbour] = current
+                    frontier.push(neighbour, next_cost)
+
+        paths = {}
+        for start in starts:
+            first = start
+            if grid[start]:
+                first = -1
+                best_cost = 0
+                for edge in range(offsets[start], offsets[start + 1]):
+                    neighbour = targets[edge]
+                    if stamp[neighbour] == search_id and (first == -1 or costs[edge] + cost[neighbour] < best_cost):
+                        first = neighbour
+                        best_cost = costs[edge] + cost[neighbour]
+            if first == -1 or stamp[first] != search_id:
+                paths[start] = None
+                continue
+            path = [start] if first != start else []
+            current = first
+            while current != -1:
+                path.append(current)
+                current = next_node[current]
+            if self.smoothing and not graph.weights:
+                path = self.smooth_path(graph, path)
+            paths[start] = path
+        return paths
+
+    @staticmethod
+    def estimate(graph, goal, heuristic=SEARCH_HEURISTIC):
+        """
+        Builds the A* estimate of the cost from any node to a goal.
+        'octile' is the exact cost of the cheapest route on an open grid, 'landmarks'
+        also takes the graph's precomputed landmark distances into account, and
+        'manhattan' overestimates diagonal moves so it may return longer paths.
+        :param graph: The weighted graph under consideration.
+        :param goal: The goal node id.
+        :param heuristic: 'manhattan', 'octile' or 'landmarks'.
+        :return: A function taking a node id and returning its estimated cost to goal.
+        """
+        if heuristic == 'landmarks':
+            return graph.landmarks().heuristic(goal)
+        width = graph.width
+        goal_x = goal % width
+        goal_y = goal // width
+        if heuristic == 'manhattan':
+            return lambda node: (abs(node % width - goal_x) + abs(node // width - goal_y)) * 10
+
+        def octile(node):
+            dx = abs(node % width - goal_x)
+            dy = abs(node // width - goal_y)
+            return 10 * max(dx, dy) + 4 * min(dx, dy)
+
+        return octile
+
+    def jump_point_search_ids(self, graph, start, goal):
+        """
+        Jump point search over a uniform cost grid.
+        Instead of queuing every neighbour, each direction is scanned in a straight
+        line until something interesting (the goal, or a node with a neighbour that
+        can only be reached optimally through it) is found, so symmetric paths
+        through open areas are never expanded.
+        :param graph: The graph under consideration. Its weights are ignored.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A list of node ids from start to goal, or None if
+                the goal cannot be reached.
+        """
+        if graph.grid[goal]:
+            return None
+        width = graph.width
+        # The scan runs on a copy of the grid with a ring of walls around
+        # it so that no bounds checks are needed while jumping
+        padded_width = width + 2
+        blocked = self.padded_grid(graph)
+        self.reset(len(blocked))
+        came_from = self.path
+        cost = self.cost
+        stamp = self.stamp
+        search_id = self.search_id
+        frontier = self.frontier.nodes
+        goal_x = goal % width
+        goal_y = goal // width
+        start = (start // width + 1) * padded_width + start % width + 1
+        goal = (goal_y + 1) * padded_width + goal_x + 1
+
+        def jump_straight(node, step, side):
+            # Scans along step; side is the offset to the neighbours either side of the line
+            while True:
+                node += step
+                if blocked[node]:
+                    return -1
+                if node == goal:
+                    return node
+                if (blocked[node + side] and not blocked[node + side + step]) or \
+                        (blocked[node - side] and not blocked[node - side + step]):
+                    return node
+
+        def jump_diagonal(node, dx, dy):
+            # Scans diagonally, checking both straight directions at each step
+            step = dx + dy
+            while True:
+                node += step
+                if blocked[node]:
+                    return -1
+                if node == goal:
+                    return node
+                if (blocked[node - dx] and not blocked[node - dx + dy]) or \
+                        (blocked[node - dy] and not blocked[node + dx - dy]):
+                    return node
+                if jump_straight(node, dx, padded_width) != -1 or jump_straight(node, dy, 1) != -1:
+                    return node
+
+        every_direction = [(dx, dy * padded_width) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+        def directions(node):
+            # Neighbours left after pruning, given the direction the node was entered from
+            parent = came_from[node]
+            if parent == -1:
+                return every_direction
+            x, y = node % padded_width, node // padded_width
+            dx = (x > parent % padded_width) - (x < parent % padded_width)
+            dy = ((y > parent // padded_width) - (y < parent // padded_width)) * padded_width
+            if dx and dy:
+                pruned = [(0, dy), (dx, 0), (dx, dy)]
+                if blocked[node - dx]:
+                    pruned.append((-dx, dy))
+                if blocked[node - dy]:
+                    pruned.append((dx, -dy))
+            elif dx:
+                pruned = [(dx, 0)]
+                if blocked[node + padded_width]:
+                    pruned.append((dx, padded_width))
+                if blocked[node - padded_width]:
+                    pruned.append((dx, -padded_width))
+            else:
+                pruned = [(0, dy)]
+                if blocked[node + 1]:
+                    pruned.append((1, dy))
+                if blocked[node - 1]:
+                    pruned.append((-1, dy))
+            return pruned
+
+        stamp[start] = search_id
+        cost[start] = 0
+        came_from[start] = -1
+        frontier.push(start, 0)
+        while frontier:
+            current = frontier.pop()[1]
+            if current == goal:
+                break
+            x = current % padded_width
+            y = current // padded_width
+            for dx, dy in directions(current):
+                if dx and dy:
+                    next = jump_diagonal(current, dx, dy)
+                elif dx:
+                    next = jump_straight(current, dx, padded_width)
+                else:
+                    next = jump_straight(current, dy, 1)
+                if next == -1:
+                    continue
+                next_x = next % padded_width
+                next_y = next // padded_width
+                steps = max(abs(next_x - x), abs(next_y - y))
+                next_cost = cost[current] + steps * (14 if dx and dy else 10)
+                if stamp[next] != search_id or next_cost < cost[next]:
+                    stamp[next] = search_id
+                    cost[next] = next_cost
+                    came_from[next] = current
+                    # Octile distance heuristic
+                    ox = abs(next_x - 1 - goal_x)
+                    oy = abs(next_y - 1 - goal_y)
+                    frontier.push(next, next_cost + 10 * max(ox, oy) + 4 * min(ox, oy))
+        if stamp[goal] != search_id:
+            return None
+
+        # Fill in the tiles skipped over between consecutive jump
+        # points while converting back to unpadded node ids
+        jump_points = self.construct_path(start, goal)
+        path = []
+        for node, next in zip(jump_points, jump_points[1:]):
+            dx = (next % padded_width > node % padded_width) - (next % padded_width < node % padded_width)
+            dy = (next // padded_width > node // padded_width) - (next // padded_width < node // padded_width)
+            while node != next:
+                path.append((node // padded_width - 1) * width + node % padded_width - 1)
+                node += dx + dy * padded_width
+        path.append((goal_y * width) + goal_x)
+        return path
+
+    def theta_star_search_ids(self, graph, start, goal):
+        """
+        Any-angle search (Theta*).
+        Works like A*, except that a node may take its parent's parent as its own
+        parent whenever there is a line of sight between them, so paths are made
+        of straight lines between turning points rather than tile steps.
+        :param graph: The graph under consideration. Its weights are ignored.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :return: A list of the node ids where the path turns, from start
+                to goal, or None if the goal cannot be reached.
+        """
+        offsets, targets, costs = graph.adjacency()
+        self.reset(len(offsets) - 1)
+        came_from = self.path
+        cost = self.cost
+        stamp = self.stamp
+        search_id = self.search_id
+        frontier = self.frontier.nodes
+        line_of_sight = graph.line_of_sight
+        width = graph.width
+        goal_x = goal % width
+        goal_y = goal // width
+
+        stamp[start] = search_id
+        cost[start] = 0
+        came_from[start] = start
+        frontier.push(start, 0)
+        while frontier:
+            current = frontier.pop()[1]
+            if current == goal:
+                break
+            parent = came_from[current]
+            parent_x = parent % width
+            parent_y = parent // width
+            for edge in range(offsets[current], offsets[current + 1]):
+                next = targets[edge]
+                next_x = next % width
+                next_y = next // width
+                if parent != current and line_of_sight(parent, next):
+                    next_parent = parent
+                    next_cost = cost[parent] + 10 * hypot(next_x - parent_x, next_y - parent_y)
+                else:
+                    next_parent = current
+                    next_cost = cost[current] + costs[edge]
+                if stamp[next] != search_id or next_cost < cost[next]:
+                    stamp[next] = search_id
+                    cost[next] = next_cost
+                    came_from[next] = next_parent
+                    # Straight line distance heuristic
+                    frontier.push(next, next_cost + 10 * hypot(next_x - goal_x, next_y - goal_y))
+        if stamp[goal] != search_id:
+            return None
+        came_from[start] = -1
+        return self.construct_path(start, goal)
+
+    @staticmethod
+    def smooth_path(graph, path):
+        """
+        String pulls a path down to its turning points by skipping
+        every node that can be seen past in a straight line.
+        :param graph: The graph the path was found in.
+        :param path: A list of node ids from start to goal.
+        :return: A list of node ids from start to goal.
+        """
+        line_of_sight = graph.line_of_sight
+        smoothed = [path[0]]
+        last = len(path) - 1
+        anchor = 0
+        while anchor < last:
+            # The furthest node visible from the anchor becomes the next turning point
+            next = anchor + 1
+            while next < last and line_of_sight(path[anchor], path[next + 1]):
+                next += 1
+            smoothed.append(path[next])
+            anchor = next
+        return smoothed
+
+    def padded_grid(self, graph):
+        """
+        Copy of the graph's occupancy grid surrounded by a one tile ring of walls.
+        The copy is cached until the graph changes.
+        :param graph: The graph under consideration.
+        :return: A bytearray (width + 2) * (height + 2) long.
+        """
+        key = (id(graph), graph.version)
+        if self.padded_key != key:
+            width = graph.width
+            padded = bytearray(b'\x01') * ((width + 2) * (graph.height + 2))
+            for y in range(graph.height):
+                row = (y + 1) * (width + 2) + 1
+                padded[row:row + width] = graph.grid[y * width:(y + 1) * width]
+            self.padded = padded
+            self.padded_key = key
+        return self.padded
+
+    @staticmethod
+    def resumable_search(graph, start, goal, heuristic=SEARCH_HEURISTIC):
+        """
+        Starts an A* search that can be spread over several frames.
+        :param graph: The weighted graph under consideration.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param heuristic: 'manhattan', 'octile' or 'landmarks'.
+        :return: A ResumableSearch; call its step method until it is done.
+        """
+        return ResumableSearch(graph, start, goal, Pathfinder.estimate(graph, goal, heuristic))
+
+    def construct_path(self, start, goal):
+        """
+        Walks the predecessors of the last search back from goal to start.
+        :param start: The initial node id.
+        :param goal: The final node id.
+        :return: A list of node ids from start to goal.
+        """
+        came_from = self.path
+        current = goal
+        path = [current]
+        while current != start:
+            current = came_from[current]
+            path.append(current)
+        path.reverse()
+        return path
+
+    @staticmethod
+    def to_waypoints(graph, path):
+        """
+        Converts node ids into world space waypoints at the centers of their tiles,
+        which is where line of sight checks and path smoothing measure from.
+        :param graph: The graph the ids belong to.
+        :param path: An iterable of node ids.
+        :return: A list of Vector2 objects, one per node.
+        """
+        width = graph.width
+        return [vec((node % width + 0.5) * TILESIZE, (node // width + 0.5) * TILESIZE) for node in path]
+
+
+class ResumableSearch:
+    """
+    A* search that keeps all of its state to itself so that it can be
+    suspended after a number of expansions and picked up again later,
+    with any number of searches in progress at the same time.
+    """
+
+    def __init__(self, graph, start, goal, estimate):
+        """
+        Starts a search.
+        :param graph: The weighted graph under consideration.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param estimate: Function returning a node id's estimated cost to goal.
+        """
+        self.graph = graph
+        self.estimate = estimate
+        self.graph_version = graph.version
+        self.start = start
+        self.goal = goal
+        self.frontier = heap.IndexedMinHeap()
+        self.frontier.push(start, 0)
+        self.came_from = {start: -1}
+        self.cost = {start: 0}
+        self.expanded = 0
+        self.done = False
+        # List of node ids from start to goal once done, None if unreachable
+        self.path = None
+
+    def stale(self):
+        """
+        :return: True if the graph has changed since the search began, False otherwise.
+        """
+        return self.graph.version != self.graph_version
+
+    def step(self, expansions):
+        """
+        Continues the search for at most the given number of node expansions.
+        :param expansions: How many nodes may be expanded before suspending.
+        :return: True if the search has finished, False if it was suspended.
+        """
+        if self.done:
+            return True
+        offsets, targets, costs = self.graph.adjacency()
+        goal = self.goal
+        estimate = self.estimate
+        frontier = self.frontier
+        came_from = self.came_from
+        cost = self.cost
+        while frontier and expansions > 0:
+            current = frontier.pop()[1]
+            if current == goal:
+                self.finish()
+                return True
+            expansions -= 1
+            self.expanded += 1
+            current_cost = cost[current]
+            for edge in range(offsets[current], offsets[current + 1]):
+                next = targets[edge]
+                next_cost = current_cost + costs[edge]
+                if next not in cost or next_cost < cost[next]:
+                    cost[next] = next_cost
+                    came_from[next] = current
+                    frontier.push(next, next_cost + estimate(next))
+        if not frontier:
+            self.finish()
+            return True
+        return False
+
+    def finish(self):
+        self.done = True
+        if self.goal not in self.came_from:
+            return
+        path = [self.goal]
+        while path[-1] != self.start:
+            path.append(self.came_from[path[-1]])
+        path.reverse()
+        self.path = path
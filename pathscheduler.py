@@ -0,0 +1,184 @@
+'''
+@author: Ned Austin Datiles
+'''
+from time import perf_counter
+from pathfinding import Pathfinder
+from settings import PATHFINDING_FRAME_BUDGET, PATHFINDING_STEP_EXPANSIONS, PATH_SMOOTHING
+
+
+class PathScheduler:
+    """
+    Spreads path searches across frames under a fixed time budget.
+    Every frame the pending searches are advanced in priority order (lowest
+    first, e.g. the requester's distance to its prey) a few expansions at a time
+    until the frame's budget runs out. Unfinished searches are suspended and
+    resumed next frame, so pathfinding never costs more than the budget per frame.
+    Has the same interface as PathService so the game can use either one.
+    """
+
+    def __init__(self, budget=PATHFINDING_FRAME_BUDGET, step_expansions=PATHFINDING_STEP_EXPANSIONS,
+                 smoothing=PATH_SMOOTHING):
+        """
+        Creates a scheduler with no pending searches.
+        :param budget: Microseconds of pathfinding allowed per frame.
+        :param step_expansions: Node expansions between checks of the clock.
+        :param smoothing: Whether finished paths are reduced to their turning points.
+        """
+        self.budget = budget
+        self.step_expansions = step_expansions
+        self.smoothing = smoothing
+        # requester -> (priority, ResumableSearch)
+        self.pending = {}
+        self.delivered = 0
+        self.dropped = 0
+        # Node expansions spent during the most recent poll
+        self.expanded = 0
+
+    def is_pending(self, requester):
+        """
+        :param requester: The entity that asked for a path.
+        :return: True if the requester has a search in progress, False otherwise.
+        """
+        return requester in self.pending
+
+    def submit(self, requester, graph, start, goal, priority=0):
+        """
+        Queues a path search, replacing any search the requester already has in progress.
+        :param requester: The entity asking for a path.
+        :param graph: The weighted graph to search.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param priority: Searches with lower priorities are advanced first.
+        :return: None
+        """
+        self.cancel(requester)
+        self.pending[requester] = (priority, Pathfinder.resumable_search(graph, start, goal))
+
+    def cancel(self, requester):
+        """
+        Forgets a requester's search in progress.
+        :param requester: The entity that asked for a path.
+        :return: None
+        """
+        if self.pending.pop(requester, None) is not None:
+            self.dropped += 1
+
+    def poll(self):
+        """
+        Advances the pending searches for up to one frame's budget.
+        :return: A list of (requester, start, goal, path) tuples for every search
+                that finished, where path is a list of node ids from start to goal,
+                or None if unreachable.
+        """
+        results = []
+        self.expanded = 0
+        deadline = perf_counter() + self.budget / 1000000
+        for requester, (_, search) in sorted(self.pending.items(), key=lambda request: request[1][0]):
+            if search.stale():
+                # The walls moved, so the requester has to ask again
+                del self.pending[requester]
+                self.dropped += 1
+                continue
+            while True:
+                expanded = search.expanded
+                finished = search.step(self.step_expansions)
+                self.expanded += search.expanded - expanded
+                if finished:
+                    del self.pending[requester]
+                    path = search.path
+                    if self.smoothing and path and not search.graph.weights:
+                        path = Pathfinder.smooth_path(search.graph, path)
+                    results.append((requester, search.start, search.goal, path))
+                    self.delivered += 1
+                    break
+                if perf_counter() >= deadline:
+                    return results
+            if perf_counter() >= deadline:
+                break
+        return results
+
+    def shutdown(self):
+        """
+        Abandons every search in progress.
+        :return: None
+        """
+        for requester in list(self.pending):
+            self.cancel(requester)
+
+
+class PathBatcher:
+    """
+    Collects the path requests made during a frame and answers every request
+    heading to the same goal with one batched search on poll. Has the same
+    interface as PathService so the game can use either one.
+    """
+
+    def __init__(self, pathfinder=None):
+        """
+        Creates a batcher with no pending requests.
+        :param pathfinder: The Pathfinder used for the batched searches.
+        """
+        self.pathfinder = pathfinder or Pathfinder()
+        # requester -> (graph, start, goal)
+        self.pending = {}
+        self.delivered = 0
+        self.dropped = 0
+        # Number of batched searches run by the most recent poll
+        self.searches = 0
+
+    def is_pending(self, requester):
+        """
+        :param requester: The entity that asked for a path.
+        :return: True if the requester is waiting for a path, False otherwise.
+        """
+        return requester in self.pending
+
+    def submit(self, requester, graph, start, goal, priority=0):
+        """
+        Queues a path request, replacing any request the requester already made.
+        :param requester: The entity asking for a path.
+        :param graph: The weighted graph to search.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param priority: Ignored; every request is answered on the next poll.
+        :return: None
+        """
+        self.cancel(requester)
+        self.pending[requester] = (graph, start, goal)
+
+    def cancel(self, requester):
+        """
+        Forgets a requester's pending request.
+        :param requester: The entity that asked for a path.
+        :return: None
+        """
+        if self.pending.pop(requester, None) is not None:
+            self.dropped += 1
+
+    def poll(self):
+        """
+        Answers every pending request, running one search per graph and goal.
+        :return: A list of (requester, start, goal, path) tuples where path is
+                a list of node ids from start to goal, or None if unreachable.
+        """
+        batches = {}
+        for requester, (graph, start, goal) in self.pending.items():
+            batches.setdefault((graph, goal), []).append((requester, start))
+        self.pending = {}
+        self.searches = len(batches)
+
+        results = []
+        for (graph, goal), requests in batches.items():
+            paths = self.pathfinder.batch_search_ids(graph, [start for _, start in requests], goal)
+            for requester, start in requests:
+                results.append((requester, start, goal, paths[start]))
+                self.delivered += 1
+        return results
+
+    def shutdown(self):
+        """
+        Abandons every pending request.
+        :return: None
+        """
+        for requester in list(self.pending):
+            self.cancel(requester)
@@ -0,0 +1,178 @@
+'''
+@author: Ned Austin Datiles
+'''
+import itertools
+import threading
+from heapq import heappush, heappop
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathfinding import Pathfinder, WeightedGraph
+from settings import PATH_WORKERS, PATH_WORKER_TYPE, SEARCH_MODE
+
+# Graph and pathfinder each worker last searched with, so consecutive
+# requests against the same snapshot reuse its adjacency
+_worker = threading.local()
+_snapshot_ids = itertools.count()
+
+
+def search_snapshot(snapshot, start, goal):
+    """
+    Runs a path search against a snapshot of a graph. Executed on a worker.
+    :param snapshot: Tuple of (id, width, height, grid bytes, weight items, search mode).
+    :param start: The starting node id.
+    :param goal: The ending node id.
+    :return: A list of node ids from start to goal, or None.
+    """
+    snapshot_id, width, height, grid, weights, mode = snapshot
+    if getattr(_worker, 'snapshot_id', None) != snapshot_id:
+        graph = WeightedGraph(width, height)
+        graph.grid = bytearray(grid)
+        graph.weights = dict(weights)
+        _worker.graph = graph
+        _worker.pathfinder = Pathfinder(mode)
+        _worker.snapshot_id = snapshot_id
+    return _worker.pathfinder.search_ids(_worker.graph, start, goal)
+
+
+class PathService:
+    """
+    Asynchronous path searches.
+    Requests are handed to a pool of worker threads (or processes) together with
+    an immutable snapshot of the graph, and finished paths are collected on a later
+    frame with poll. Requests wait in a priority queue until a worker is free, so
+    the most urgent searches start first however many are waiting. A requester only
+    ever has one search in flight; a new request replaces the old one, and results
+    found on an out of date snapshot are dropped.
+    """
+
+    def __init__(self, workers=PATH_WORKERS, worker_type=PATH_WORKER_TYPE, mode=SEARCH_MODE):
+        """
+        Starts the worker pool.
+        :param workers: How many searches may run at once.
+        :param worker_type: 'thread' or 'process'.
+        :param mode: The Pathfinder search mode the workers use.
+        """
+        if worker_type == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.mode = mode
+        # requester -> [future, graph, graph version, start, goal, order, snapshot].
+        # The future is None while the request waits for a worker
+        self.pending = {}
+        # Heap of (priority, order, requester) for the waiting requests. Entries left
+        # behind by replaced or cancelled requests are skipped
+        self.queue = []
+        self.order = 0
+        self.running = 0
+        # Finished searches start the next waiting ones from the worker side
+        self.lock = threading.RLock()
+        self.snapshot = None
+        self.snapshot_source = None
+        self.delivered = 0
+        self.dropped = 0
+
+    def snapshot_of(self, graph):
+        """
+        Takes (or reuses) an immutable copy of a graph for the workers.
+        :param graph: The weighted graph to copy.
+        :return: The snapshot tuple.
+        """
+        source = (id(graph), graph.version)
+        if source != self.snapshot_source:
+            self.snapshot = (next(_snapshot_ids), graph.width, graph.height, bytes(graph.grid),
+                             tuple(graph.weights.items()), self.mode)
+            self.snapshot_source = source
+        return self.snapshot
+
+    def is_pending(self, requester):
+        """
+        :param requester: The entity that asked for a path.
+        :return: True if the requester has a search in flight, False otherwise.
+        """
+        return requester in self.pending
+
+    def submit(self, requester, graph, start, goal, priority=0):
+        """
+        Queues a path search, replacing any search the requester already has in flight.
+        :param requester: The entity asking for a path.
+        :param graph: The weighted graph to search.
+        :param start: The starting node id.
+        :param goal: The ending node id.
+        :param priority: Searches with lower priorities are started first.
+        :return: None
+        """
+        with self.lock:
+            self.cancel(requester)
+            self.order += 1
+            self.pending[requester] = [None, graph, graph.version, start, goal, self.order,
+                                       self.snapshot_of(graph)]
+            heappush(self.queue, (priority, self.order, requester))
+            self.dispatch()
+
+    def dispatch(self):
+        """
+        Starts the most urgent waiting searches while there are idle workers.
+        :return: None
+        """
+        with self.lock:
+            while self.queue and self.running < self.workers:
+                _, order, requester = heappop(self.queue)
+                request = self.pending.get(requester)
+                if request is None or request[5] != order:
+                    continue
+                self.running += 1
+                request[0] = self.executor.submit(search_snapshot, request[6], request[3], request[4])
+                request[0].add_done_callback(self.finished)
+
+    def finished(self, future):
+        """
+        Frees the worker that ran a search and starts the next one.
+        :param future: The search's future.
+        :return: None
+        """
+        with self.lock:
+            self.running -= 1
+            self.dispatch()
+
+    def cancel(self, requester):
+        """
+        Forgets a requester's search in flight.
+        :param requester: The entity that asked for a path.
+        :return: None
+        """
+        with self.lock:
+            request = self.pending.pop(requester, None)
+            if request is not None:
+                if request[0] is not None:
+                    request[0].cancel()
+                self.dropped += 1
+
+    def poll(self):
+        """
+        Collects every search that has finished since the last poll.
+        :return: A list of (requester, start, goal, path) tuples where path is
+                a list of node ids from start to goal, or None if unreachable.
+        """
+        results = []
+        with self.lock:
+            for requester, (future, graph, version, start, goal, _, _) in list(self.pending.items()):
+                if future is None or not future.done():
+                    continue
+                del self.pending[requester]
+                if graph.version != version:
+                    # The walls moved while the search was running
+                    self.dropped += 1
+                    continue
+                results.append((requester, start, goal, future.result()))
+                self.delivered += 1
+        return results
+
+    def shutdown(self):
+        """
+        Stops the worker pool, abandoning any searches in flight.
+        :return: None
+        """
+        for requester in list(self.pending):
+            self.cancel(requester)
+        self.executor.shutdown(wait=False)
@@ -74,6 +74,7 @@ class Player(pg.sprite.Sprite):
 
         # Player rotation
         self.rot = 0
+        self.game.player_frames.warm(self.weapon, self.rot)
 
         # Forces all melee or reload animation frames to be used at most
         # once before returning back to regular action
@@ -234,6 +235,10 @@ class Player(pg.sprite.Sprite):
             self.current_frame = 0
             self.weapon = 'knife'
             self.game.weapon_sounds[self.weapon]['draw'].play()
+        else:
+            return
+        # Have the new weapon's frames ready at the current angle
+        self.game.player_frames.warm(self.weapon, self.rot)
 
     def play_foot_step_sounds(self, sprinting, terrain='dirt'):
         """
@@ -355,7 +360,7 @@ class Player(pg.sprite.Sprite):
             if now - self.last_update > WEAPONS['animation times'][self.weapon][self.action]:
                 self.last_update = now
                 self.current_frame = (self.current_frame + 1) % len(self.animations)
-            self.image = pg.transform.rotozoom(self.animations[self.current_frame], self.rot, 1)
+            self.image = self.game.player_frames.rotated(self.weapon, self.action, self.current_frame, self.rot)
             self.rect = self.image.get_rect()
         else:
             self.animations = self.game.player_animations[self.weapon][self.canned_action]
@@ -366,7 +371,8 @@ class Player(pg.sprite.Sprite):
                 # until all of the frames for that specific action
                 # have been used up.
                 try:
-                    self.image = pg.transform.rotozoom(self.animations[self.current_frame], self.rot, 1)
+                    self.image = self.game.player_frames.rotated(self.weapon, self.canned_action,
+                                                                 self.current_frame, self.rot)
                     self.rect = self.image.get_rect()
                 except IndexError:
                     self.play_static_animation = False
@@ -0,0 +1,122 @@
+'''
+@author: Ned Austin Datiles
+'''
+from collections import OrderedDict
+import pygame as pg
+from settings import ENEMY_ROTATIONS, PLAYER_ROTATIONS, PLAYER_FRAME_CACHE_SIZE
+
+
+class RotationAtlas:
+    """
+    Rotated copies of a set of images at evenly spaced angles.
+    Sprites that turn freely, like the mobs, snap their angle to the nearest
+    step and share the atlas' frame instead of rotating their own image every
+    frame. Frames are rendered the first time they are asked for, or all at
+    once by warm.
+    """
+
+    def __init__(self, images, angles=ENEMY_ROTATIONS):
+        """
+        Creates an atlas with no frames rendered yet.
+        :param images: List of the unrotated images.
+        :param angles: How many angles each image is rendered at.
+        """
+        self.images = images
+        self.angles = angles
+        self.step = 360 / angles
+        # frames[image][angle index], None until rendered
+        self.frames = [[None] * angles for _ in images]
+
+    def index(self, angle):
+        """
+        Snaps an angle to the closest one in the atlas.
+        :param angle: The angle in degrees.
+        :return: The angle's index.
+        """
+        return round(angle / self.step) % self.angles
+
+    def frame(self, image, index):
+        """
+        Gets a rendered frame, rendering it if necessary.
+        :param image: Index of the image in the list the atlas was made with.
+        :param index: The angle's index.
+        :return: The rotated Surface, shared by everything that uses it.
+        """
+        frame = self.frames[image][index]
+        if frame is None:
+            frame = pg.transform.rotozoom(self.images[image], index * self.step, 1)
+            self.frames[image][index] = frame
+        return frame
+
+    def rotated(self, image, angle):
+        """
+        Gets an image rotated to the closest angle in the atlas.
+        :param image: Index of the image in the list the atlas was made with.
+        :param angle: The angle in degrees.
+        :return: The rotated Surface, shared by everything that uses it.
+        """
+        return self.frame(image, self.index(angle))
+
+    def warm(self):
+        """
+        Renders every frame of the atlas.
+        :return: None
+        """
+        for image in range(len(self.images)):
+            for index in range(self.angles):
+                self.frame(image, index)
+
+
+class FrameCache:
+    """
+    Least recently used cache of rotated animation frames.
+    Frames are keyed on (weapon, action, frame index, angle index), with angles
+    snapped to evenly spaced steps, so an animation frame is only rotated again
+    when neither it nor the angle has been seen recently.
+    """
+
+    def __init__(self, animations, angles=PLAYER_ROTATIONS, size=PLAYER_FRAME_CACHE_SIZE):
+        """
+        Creates an empty cache.
+        :param animations: Dictionary of weapon -> action -> list of frames.
+        :param angles: How many angles a full turn is split into.
+        :param size: The most rotated frames kept.
+        """
+        self.animations = animations
+        self.angles = angles
+        self.step = 360 / angles
+        self.size = size
+        self.frames = OrderedDict()
+
+    def rotated(self, weapon, action, frame, angle):
+        """
+        Gets an animation frame rotated to the closest step of an angle.
+        :param weapon: The weapon whose animations are used.
+        :param action: The action being animated.
+        :param frame: Index of the frame in the action's animation.
+        :param angle: The angle in degrees.
+        :return: The rotated Surface.
+        """
+        index = round(angle / self.step) % self.angles
+        key = (weapon, action, frame, index)
+        image = self.frames.get(key)
+        if image is None:
+            # Raises IndexError past the last frame, like indexing the animation
+            image = pg.transform.rotozoom(self.animations[weapon][action][frame], index * self.step, 1)
+            self.frames[key] = image
+            if len(self.frames) > self.size:
+                self.frames.popitem(last=False)
+        else:
+            self.frames.move_to_end(key)
+        return image
+
+    def warm(self, weapon, angle):
+        """
+        Renders every frame of every action of a weapon at an angle.
+        :param weapon: The weapon whose animations are rendered.
+        :param angle: The angle in degrees.
+        :return: None
+        """
+        for action, frames in self.animations[weapon].items():
+            for frame in range(len(frames)):
+                self.rotated(weapon, action, frame, angle)
@@ -102,6 +102,10 @@ PLAYER_MELEE_RECT = pg.Rect(0, 0, 64, 64)
 PLAYER_HEALTH = 100
 PLAYER_STAMINA = 100
 PLAYER_MELEE_STUMBLE = 100
+# How many angles the player's animation frames are rotated to (the player snaps to the
+# closest one), and how many rotated frames are cached
+PLAYER_ROTATIONS = 360
+PLAYER_FRAME_CACHE_SIZE = 256
 PLAYER_HIT_SOUNDS = ['Player/Pain/8.wav', 'Player/Pain/9.wav', 'Player/Pain/10.wav',
                      'Player/Pain/11.wav', 'Player/Pain/12.wav', 'Player/Pain/13.wav',
                      'Player/Pain/14.wav']
@@ -147,11 +151,42 @@ ENEMY_DAMAGE = [10]
 ENEMY_KNOCKBACK = 10
 ENEMY_LINE_OF_SIGHT = TILESIZE / 2
 ENEMY_HIT_RECT = pg.Rect(0, 0, 50, 50)
+# How many angles the mob images are pre-rotated at (mobs snap to the closest one)
+ENEMY_ROTATIONS = 72
 ENEMY_SPEEDS = [speed for speed in range(40, 100, 10)]
 ENEMY_HEALTH = [400]
 DETECT_RADIUS = 400
 APPROACH_RADIUS = 150
 AVOID_RADIUS = 10
+# Cell size of the grid mobs are bucketed into for neighbour queries, and how far beyond
+# a query's radius it looks to cover mobs that moved since the grid was rebuilt this frame
+SPATIAL_HASH_CELL_SIZE = 2 * TILESIZE
+SPATIAL_HASH_MARGIN = TILESIZE / 4
+# Steer and move every mob at once with NumPy arrays (ignored if NumPy is not installed).
+# Horde mobs chase the player along the shared flow field whatever MOB_NAVIGATION is, and
+# only the sprites of mobs within HORDE_SYNC_MARGIN pixels of the screen are kept up to date
+HORDE_ENGINE = False
+HORDE_SYNC_MARGIN = 2 * TILESIZE
+# How many cells each tile is split into, along each side, by the field mobs look up
+# the closest wall in when avoiding obstacles
+WALL_FIELD_RESOLUTION = 4
+# Sprites are only drawn within CULL_MARGIN pixels of the screen, and mobs are only active
+# within ACTIVE_MARGIN pixels of it. The active band reaches past the last AI_LOD_TIERS
+# distance and the distance at which mobs ask for paths, so both come into play.
+# Walls are looked up in a grid of CULL_CELL_SIZE pixel cells when working out what is visible
+CULL_MARGIN = 2 * TILESIZE
+ACTIVE_MARGIN = DETECT_RADIUS * 3
+CULL_CELL_SIZE = 4 * TILESIZE
+# Update mobs at a level of detail that drops with their distance from the player: mobs
+# within each tier's distance are updated once every that many frames, and inactive mobs
+# or those beyond the last tier sleep for AI_SLEEP_INTERVAL frames at a time. At most
+# AI_FRAME_BUDGET microseconds are spent on mobs per frame, and a mob is never advanced by
+# more than AI_MAX_DT seconds at once. Not used by the horde engine
+AI_LOD = True
+AI_LOD_TIERS = [(DETECT_RADIUS, 1), (DETECT_RADIUS * 2, 2), (DETECT_RADIUS * 3, 4)]
+AI_SLEEP_INTERVAL = 30
+AI_FRAME_BUDGET = 5000
+AI_MAX_DT = 0.2
 SEEK_FORCE = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
 WANDER_RING_DISTANCE = 100
 WANDER_RING_RADIUS = [x for x in range(40, 100, 10)]
@@ -207,6 +242,62 @@ ENEMY_IMGS = [
     'img/Enemies/citizenzombie10.png',
 ]
 
+# Navigation settings
+# 'flow field' - every mob follows one shared field towards the player
+# 'path' - mobs take turns requesting their own path to the player
+# 'incremental' - every mob keeps a D* Lite planner that is repaired as the player moves
+# 'hierarchical' - like 'path', but routes are searched on a cluster graph (HPA*) for large maps
+# 'navmesh' - like 'path', but routes are searched on a navigation mesh of merged open rectangles
+MOB_NAVIGATION = 'flow field'
+# Search used for individual paths: 'a*', 'jps' (jump point search) or 'theta*'
+# (any-angle search). The last two are only used while no tile weights are set
+# and fall back to A* otherwise
+SEARCH_MODE = 'jps'
+# Estimate A* searches use: 'manhattan', 'octile' (exact on open ground) or 'landmarks'
+# (ALT, distances to a few landmark tiles precomputed once per map), and how many landmarks
+SEARCH_HEURISTIC = 'landmarks'
+LANDMARK_COUNT = 8
+# Reduce a* and jps paths to their turning points by string pulling along lines of sight
+PATH_SMOOTHING = True
+# How 'path' navigation searches are scheduled:
+# 'budget' - searches are spread across frames under a per frame time budget, closest mobs first
+# 'async' - searches run on a background worker pool
+# 'batch' - every request made during a frame is answered by one search back from the player
+# 'round robin' - one mob at a time may search, taking turns every 5 seconds
+PATH_SCHEDULING = 'budget'
+# Microseconds of pathfinding allowed per frame, and node expansions between checks of the clock
+PATHFINDING_FRAME_BUDGET = 2000
+PATHFINDING_STEP_EXPANSIONS = 64
+# How many searches may run at once, and whether the workers are 'thread's or 'process'es
+PATH_WORKERS = 2
+PATH_WORKER_TYPE = 'thread'
+# How many (start tile, goal tile) paths Game.find_path keeps cached. Requests the next hop
+# table below can answer never reach the cache, so while NEXT_HOP_TABLE is on it only serves
+# maps with too many open tiles for the table and mobs that have been pushed into a wall
+PATH_CACHE_SIZE = 256
+# Answer 'path' navigation requests from an all-pairs next hop table built at map load,
+# as long as the map has no more than NEXT_HOP_MAX_TILES open tiles (the table takes
+# open tiles squared * 2 bytes). The table is saved beside the map file when persisted.
+NEXT_HOP_TABLE = True
+NEXT_HOP_MAX_TILES = 1024
+NEXT_HOP_PERSIST = True
+# Save the occupancy grid, region ids, landmark distances and cluster graph of each map
+# in a '.nav' file beside it, which later launches load instead of rebuilding them
+NAV_DATA_CACHE = True
+# Group mobs chasing the player into squads in 'path' and 'navmesh' navigation, where only
+# the squad leader asks for a path and the rest follow it. Mobs within SQUAD_RADIUS pixels of
+# a leader join its squad (up to SQUAD_MAX_SIZE mobs); squads are regrouped every
+# SQUAD_REGROUP_INTERVAL milliseconds
+SQUAD_PATHING = True
+SQUAD_RADIUS = 4 * TILESIZE
+SQUAD_MAX_SIZE = 12
+SQUAD_REGROUP_INTERVAL = 500
+# How far in pixels navmesh routes keep from walls: half the width of a mob's hit rect, which
+# has to be less than half a tile so that one tile wide corridors stay open
+NAVMESH_AGENT_RADIUS = ENEMY_HIT_RECT.width // 2
+# Width and height in tiles of the clusters used by hierarchical pathfinding
+CLUSTER_SIZE = 8
+
 # Weapon settings
 WEAPONS = {}
 
@@ -0,0 +1,99 @@
+'''
+@author: Ned Austin Datiles
+'''
+from settings import SPATIAL_HASH_CELL_SIZE, SPATIAL_HASH_MARGIN
+
+
+class SpatialHash:
+    """
+    Uniform bucket grid over sprite positions.
+    Sprites are dropped into square cells by their position once per frame, so
+    finding the sprites near a point only looks at the few cells around it
+    instead of every sprite in the game.
+    """
+
+    def __init__(self, cell_size=SPATIAL_HASH_CELL_SIZE, margin=SPATIAL_HASH_MARGIN):
+        """
+        Creates an empty grid.
+        :param cell_size: Width and height of each cell in pixels.
+        :param margin: Extra distance searched by every query, covering how far
+                a sprite may move between rebuilds.
+        """
+        self.cell_size = cell_size
+        self.margin = margin
+        # (column, row) -> list of sprites
+        self.cells = {}
+
+    def rebuild(self, sprites):
+        """
+        Re-buckets every sprite by its current position.
+        :param sprites: Iterable of sprites with a pos attribute.
+        :return: None
+        """
+        cells = {}
+        size = self.cell_size
+        for sprite in sprites:
+            key = (int(sprite.pos.x // size), int(sprite.pos.y // size))
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [sprite]
+            else:
+                bucket.append(sprite)
+        self.cells = cells
+
+    def remove(self, sprite):
+        """
+        Takes a sprite out of the grid before the next rebuild, e.g. when it is killed.
+        :param sprite: The sprite to remove.
+        :return: None
+        """
+        size = self.cell_size
+        bucket = self.cells.get((int(sprite.pos.x // size), int(sprite.pos.y // size)))
+        if bucket and sprite in bucket:
+            bucket.remove(sprite)
+            return
+        for bucket in self.cells.values():
+            if sprite in bucket:
+                bucket.remove(sprite)
+                return
+
+    def query(self, pos, radius):
+        """
+        Finds the sprites that may lie within a radius of a point. Candidates are
+        only filtered by cell, so callers still check the exact distance.
+        :param pos: The centre of the query.
+        :param radius: The query radius in pixels.
+        :return: A list of sprites.
+        """
+        size = self.cell_size
+        reach = radius + self.margin
+        left = int((pos.x - reach) // size)
+        right = int((pos.x + reach) // size)
+        top = int((pos.y - reach) // size)
+        bottom = int((pos.y + reach) // size)
+        cells = self.cells
+        found = []
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                bucket = cells.get((column, row))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def query_rect(self, rect):
+        """
+        Finds the sprites that may lie within a rectangle. Candidates are only
+        filtered by cell, so callers still check the exact overlap.
+        :param rect: The area to search, a Rect in world space.
+        :return: A list of sprites.
+        """
+        size = self.cell_size
+        margin = self.margin
+        cells = self.cells
+        found = []
+        for column in range(int((rect.left - margin) // size), int((rect.right + margin) // size) + 1):
+            for row in range(int((rect.top - margin) // size), int((rect.bottom + margin) // size) + 1):
+                bucket = cells.get((column, row))
+                if bucket:
+                    found.extend(bucket)
+        return found
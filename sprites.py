@@ -107,7 +107,7 @@ class MuzzleFlash(pg.sprite.Sprite):
         :param pos: The location where this muzzle flash will appear represented as a vector
         """
         self._layer = EFFECTS_LAYER
-        self.groups = game.all_sprites
+        self.groups = game.all_sprites, game.effects
         pg.sprite.Sprite.__init__(self, self.groups)
         self.game = game
         size = randint(WEAPONS[game.player.weapon]['muzzle flash range'][0],
@@ -0,0 +1,119 @@
+'''
+@author: Ned Austin Datiles
+'''
+from settings import DETECT_RADIUS, SQUAD_RADIUS, SQUAD_MAX_SIZE, SQUAD_REGROUP_INTERVAL
+
+
+class Squad:
+    """
+    A pack of mobs chasing the same prey. Only the leader asks for a path;
+    the rest of the squad steers towards the leader's next waypoint and
+    lets flocking keep them together.
+    """
+
+    def __init__(self, leader):
+        """
+        Creates a squad of one.
+        :param leader: The mob whose path the squad follows.
+        """
+        self.leader = leader
+        self.members = [leader]
+
+    def add(self, mob):
+        """
+        Adds a follower to the squad.
+        :param mob: The mob joining the squad.
+        :return: None
+        """
+        self.members.append(mob)
+        mob.squad = self
+
+    def follows(self, mob):
+        """
+        :param mob: A mob in the squad.
+        :return: True if the mob should steer off a living leader, False otherwise.
+        """
+        return self.leader is not mob and self.leader.alive()
+
+    def waypoint(self):
+        """
+        The waypoint the leader is heading to.
+        :return: A Vector2, or None if the leader has no path.
+        """
+        leader = self.leader
+        if not leader.alive() or not leader.path or leader.current_path_target < 0:
+            return None
+        return leader.path[leader.current_path_target]
+
+
+class SquadManager:
+    """
+    Periodically groups mobs that are close together and still far from their
+    prey into squads, so that the number of path searches grows with the number
+    of packs rather than the number of mobs.
+    """
+
+    def __init__(self, radius=SQUAD_RADIUS, max_size=SQUAD_MAX_SIZE, interval=SQUAD_REGROUP_INTERVAL):
+        """
+        Creates a manager with no squads.
+        :param radius: How close to a leader a mob has to be to join its squad.
+        :param max_size: The most mobs in one squad.
+        :param interval: Milliseconds between regroupings.
+        """
+        self.radius = radius
+        self.max_size = max_size
+        self.interval = interval
+        self.squads = []
+        self.last_regroup = None
+
+    def update(self, mobs, prey, now, grid):
+        """
+        Regroups the squads once every interval.
+        :param mobs: The mobs to group.
+        :param prey: The entity the mobs are chasing.
+        :param now: The current time in milliseconds.
+        :param grid: A SpatialHash holding the mobs at their current positions.
+        :return: None
+        """
+        if self.last_regroup is None or now - self.last_regroup >= self.interval:
+            self.last_regroup = now
+            self.regroup(mobs, prey, grid)
+
+    def regroup(self, mobs, prey, grid):
+        """
+        Splits the mobs into squads. Existing leaders keep their squads (and paths) where
+        possible, then the mobs closest to the prey lead; every unassigned mob within the
+        radius of a leader joins it until the squad is full. Mobs that are off screen
+        (and so not moving) or close enough to pursue their prey directly are left out.
+        :param mobs: The mobs to group.
+        :param prey: The entity the mobs are chasing.
+        :param grid: A SpatialHash holding the mobs at their current positions.
+        :return: None
+        """
+        leaders = {squad.leader for squad in self.squads}
+        candidates = []
+        for mob in mobs:
+            mob.squad = None
+            if mob.is_onscreen and mob.pos.distance_to(prey.pos) > DETECT_RADIUS:
+                candidates.append(mob)
+        candidates.sort(key=lambda mob: (mob not in leaders, mob.pos.distance_squared_to(prey.pos)))
+        # Mobs join squads in the same order they are picked as leaders
+        rank = {mob: order for order, mob in enumerate(candidates)}
+
+        radius = self.radius ** 2
+        self.squads = []
+        for leader in candidates:
+            if leader.squad is not None:
+                continue
+            squad = Squad(leader)
+            leader.squad = squad
+            nearby = [mob for mob in grid.query(leader.pos, self.radius) if mob in rank]
+            nearby.sort(key=rank.get)
+            for mob in nearby:
+                if len(squad.members) >= self.max_size:
+                    break
+                if mob.squad is None and mob.pos.distance_squared_to(leader.pos) <= radius:
+                    squad.add(mob)
+                    # Followers give up their own paths for the leader's
+                    mob.path = None
+            self.squads.append(squad)
@@ -9,6 +9,7 @@ from settings import TILESIZE, WIDTH, HEIGHT
 
 class Map:
     def __init__(self, filename):
+        self.filename = filename
         self.data = []
         with open(filename, 'rt') as file:
             for line in file:
@@ -50,6 +51,15 @@ class Camera:
         # a rectangle
         return rect.move(self.camera.topleft)
 
+    def view(self, margin=0):
+        """
+        The part of the map the camera shows
+        :param margin: How far to grow the view on every side
+        :return: The view as a Rect in world space
+        """
+        return pg.Rect(-self.camera.x - margin, -self.camera.y - margin,
+                       WIDTH + 2 * margin, HEIGHT + 2 * margin)
+
     def update(self, target):
         """
         Updates the location of the camera relative to the target
@@ -0,0 +1,138 @@
+'''
+@author: Ned Austin Datiles
+'''
+from array import array
+from math import hypot
+import heap
+from settings import TILESIZE, WALL_FIELD_RESOLUTION, vec
+
+
+class WallField:
+    """
+    Nearest wall lookup for the whole map.
+    The map is split into cells a fraction of a tile wide, and every cell remembers
+    the wall tile whose center is closest to it and how far away that is. Walls are
+    spread outwards from their own cells with Dijkstra's algorithm, each cell handing
+    its wall on to its neighbours, so the field is built once per map and sampled
+    in constant time however many walls there are.
+    """
+
+    def __init__(self, graph, radius, resolution=WALL_FIELD_RESOLUTION):
+        """
+        Builds the field for a graph's walls.
+        :param graph: The graph whose walls the field covers.
+        :param radius: How close to a wall's center a point has to be to collide with it.
+        :param resolution: How many cells each tile is split into along each side.
+        """
+        self.graph = graph
+        self.radius = radius
+        self.resolution = resolution
+        self.cell_size = TILESIZE / resolution
+        self.columns = graph.width * resolution
+        self.rows = graph.height * resolution
+        self.graph_version = -1
+        # Node id of the closest wall to each cell, -1 if there are no walls
+        self.nearest = None
+        # Distance from each cell's center to that wall's center
+        self.distance = None
+        self.build()
+
+    def build(self):
+        """
+        Spreads every wall over the cells closest to it.
+        :return: None
+        """
+        graph = self.graph
+        resolution = self.resolution
+        size = self.cell_size
+        columns = self.columns
+        rows = self.rows
+        nearest = array('i', [-1]) * (columns * rows)
+        distance = array('d', [float('inf')]) * (columns * rows)
+        seeds = []
+        for node, cell in enumerate(graph.grid):
+            if not cell:
+                continue
+            x, y = graph.node_coords(node)
+            wall_x = (x + 0.5) * TILESIZE
+            wall_y = (y + 0.5) * TILESIZE
+            for row in range(y * resolution, (y + 1) * resolution):
+                for column in range(x * resolution, (x + 1) * resolution):
+                    index = row * columns + column
+                    nearest[index] = node
+                    distance[index] = hypot((column + 0.5) * size - wall_x, (row + 0.5) * size - wall_y)
+                    seeds.append((distance[index], index))
+
+        frontier = heap.IndexedMinHeap(seeds)
+        width = graph.width
+        while frontier:
+            _, current = frontier.pop()
+            node = nearest[current]
+            wall_x = (node % width + 0.5) * TILESIZE
+            wall_y = (node // width + 0.5) * TILESIZE
+            column = current % columns
+            row = current // columns
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)):
+                next_column = column + dx
+                next_row = row + dy
+                if not (0 <= next_column < columns and 0 <= next_row < rows):
+                    continue
+                index = next_row * columns + next_column
+                next_distance = hypot((next_column + 0.5) * size - wall_x, (next_row + 0.5) * size - wall_y)
+                if next_distance < distance[index]:
+                    distance[index] = next_distance
+                    nearest[index] = node
+                    frontier.push(index, next_distance)
+        self.nearest = nearest
+        self.distance = distance
+        self.graph_version = graph.version
+
+    def cell(self, pos):
+        """
+        Finds the cell under a world space position. Positions off the map use the closest cell on it.
+        :param pos: The world space position.
+        :return: The cell's index.
+        """
+        column = min(max(int(pos[0] // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(pos[1] // self.cell_size), 0), self.rows - 1)
+        return row * self.columns + column
+
+    def nearest_wall(self, pos):
+        """
+        Finds the wall closest to a world space position.
+        :param pos: The world space position.
+        :return: A (wall x, wall y, distance) tuple for the wall's
+                center, or None if the map has no walls.
+        """
+        if self.graph_version != self.graph.version:
+            self.build()
+        node = self.nearest[self.cell(pos)]
+        if node == -1:
+            return None
+        width = self.graph.width
+        wall_x = (node % width + 0.5) * TILESIZE
+        wall_y = (node // width + 0.5) * TILESIZE
+        return wall_x, wall_y, hypot(pos[0] - wall_x, pos[1] - wall_y)
+
+    def most_threatening(self, pos, probes):
+        """
+        Finds the wall an entity is most likely to run into. Each probe is checked
+        against the wall closest to it, and of the walls the probes collide with
+        the one closest to the entity is the most threatening.
+        :param pos: The entity's position.
+        :param probes: World space points along the entity's line of sight.
+        :return: A Vector2 at the most threatening wall's center, or None.
+        """
+        most_threatening = None
+        closest = 0
+        for probe in probes:
+            wall = self.nearest_wall(probe)
+            if wall is None or wall[2] > self.radius:
+                continue
+            dist = hypot(pos[0] - wall[0], pos[1] - wall[1])
+            if most_threatening is None or dist < closest:
+                most_threatening = wall
+                closest = dist
+        if most_threatening is None:
+            return None
+        return vec(most_threatening[0], most_threatening[1])